@@ -0,0 +1,353 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import requests
+
+from checkpoint import DedupStore
+from run_me import BedbathandbeyondScraper, OverstockScraper, WayfairScraper
+from sinks import SINKS, BackgroundSink
+
+try:
+    import aiohttp
+    import aiohttp.web
+except ImportError:
+    aiohttp = None
+
+HEADERS = ["URL", "Category", "Price", "Reviews", "Rating"]
+
+
+class StubServer:
+    def __init__(self, respond, latency=0.0):
+        self.respond = respond
+        self.latency = latency
+        self.requests = 0
+        self.loop = asyncio.new_event_loop()
+
+    async def handle(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        status, content_type, body = self.respond(request.path_qs, request.headers, await request.read())
+        return aiohttp.web.Response(status=status, body=body, content_type=content_type, charset="utf-8")
+
+    async def start(self):
+        app = aiohttp.web.Application()
+        app.router.add_route("*", "/{tail:.*}", self.handle)
+        self.runner = aiohttp.web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await aiohttp.web.TCPSite(self.runner, "127.0.0.1", 0, backlog=4096).start()
+        return f"http://127.0.0.1:{self.runner.addresses[0][1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.url = asyncio.run_coroutine_threadsafe(self.start(), self.loop).result()
+        return self
+
+    def __exit__(self, *exc_info):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def run_scraper(cls, run=None, **settings):
+    directory = tempfile.mkdtemp(prefix=f"bench-{cls.name}-")
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        scraper_class = type(cls.__name__, (cls,), {"counts": {}, "use_debug": False, **settings})
+        started = time.perf_counter()
+        with scraper_class() as scraper:
+            if run:
+                run(scraper)
+            else:
+                scraper.run()
+        return time.perf_counter() - started, sum(scraper.request_counts.values()), scraper.rows
+    finally:
+        os.chdir(cwd)
+        logging.getLogger().handlers.clear()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def wayfair_listing(page_index, last_page, items=48):
+    listings = [
+        {"__typename": "RecommendedListingCollectionItem", "displayName": f"Kids Bed {page_index}-{index}",
+         "listingUrl": f"https://www.wayfair.com/baby-kids/pdp/kids-bed-{page_index}-{index}.html",
+         "pricing": {"amount": f"{100 + index}.99"}, "reviewRating": {"averageRating": 4.5, "totalCount": 100 + index}}
+        for index in range(items)
+    ]
+    flight = f"2b:{json.dumps({'data': {'browse': {'browse_grid_objects': {'items': listings}}}})}\n"
+    return (
+        f"<html><body><script>self.__next_f.push([1,{json.dumps(flight)}])</script>"
+        f'<a data-enzyme-id="paginationLastPageLink" href="#">{last_page}</a></body></html>'
+    ).encode("utf-8")
+
+
+def wayfair_stub(last_page):
+    def respond(path, headers, body):
+        match = re.search(r"curpage=(\d+)", path)
+        return 200, "text/html", wayfair_listing(int(match.group(1)) if match else 0, last_page)
+    return respond
+
+
+def bench_sinks(rows=200000, batch_size=500):
+    directory = tempfile.mkdtemp(prefix="bench-sinks-")
+    batch = [[f"https://www.example.com/p/{index}", "Sofas", "499.99", "12", "4.5"] for index in range(batch_size)]
+    try:
+        for name, sink in SINKS.items():
+            for background in (False, True):
+                path = os.path.join(directory, f"{name}.{int(background)}.{sink.extension}")
+                try:
+                    writer = sink(path, HEADERS, batch_size=batch_size)
+                    if background:
+                        writer = BackgroundSink(writer)
+                except RuntimeError as e:
+                    print(f"bench: sink {name} - {e}")
+                    break
+                started = time.perf_counter()
+                with writer:
+                    for _ in range(rows // batch_size):
+                        writer.write_many(batch)
+                seconds = time.perf_counter() - started
+                print(
+                    f"bench: sink {name}{' in background' if background else ''} - {rows} rows in {seconds:.2f}s, "
+                    f"{rows / seconds:.0f} rows/s, {os.path.getsize(path) >> 20} MB"
+                )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def bench_concurrency(levels=(1, 4, 16, 64), last_page=64, latency=0.05):
+    if aiohttp is None:
+        print("bench: concurrency - the stub server needs aiohttp installed")
+        return
+    with StubServer(wayfair_stub(last_page), latency) as server:
+        for level in levels:
+            seconds, pages, rows = run_scraper(
+                WayfairScraper,
+                scraper_api=f"{server.url}/?url=",
+                max_concurrency=level,
+                early_stop=False,
+                counts={"Kids Beds": 0},
+                discover=lambda self: [(None, self.parse_products, "https://www.wayfair.com/baby-kids/sb0/kids-beds-c1870.html", "Kids Beds")],
+            )
+            print(f"bench: concurrency {level} - {pages} pages, {rows} rows in {seconds:.2f}s, {pages / seconds:.1f} pages/s at {latency * 1000:.0f} ms latency")
+
+
+def dedup_key(index):
+    return f"https://www.wayfair.com/baby-kids/pdp/kids-bed-{index}.html"
+
+
+def dedup_build(size, page, compact=None):
+    store = [] if compact is None else DedupStore(compact)
+    for start in range(0, size, page):
+        keys = [dedup_key(index) for index in range(start, min(size, start + page))]
+        if compact is None:
+            store.extend(keys)
+        else:
+            store.add_many(keys)
+    return store
+
+
+def bench_dedup(sizes=(10000, 100000, 1000000), page=48, probes=1000):
+    misses = [f"https://www.wayfair.com/baby-kids/pdp/missing-{index}.html" for index in range(probes)]
+    for size in sizes:
+        for label, compact in (("list", None), ("set", False), ("compact", True)):
+            started = time.perf_counter()
+            store = dedup_build(size, page, compact)
+            seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            for key in misses:
+                key in store
+            lookup = (time.perf_counter() - started) / probes
+            del store
+            tracemalloc.start()
+            store = dedup_build(size, page, compact)
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del store
+            if compact is None:
+                seconds += lookup * size / 2
+            print(
+                f"bench: dedup {label} x{size} - "
+                f"{lookup * 1e6:.1f} us per lookup, {'~' if compact is None else ''}{seconds:.2f}s to dedup {size} keys, {memory / 2 ** 20:.0f} MB"
+            )
+
+
+def wayfair_fixture_pages(pad=0):
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "fixtures", "wayfair")
+    filler = json.dumps({"header": [{"label": f"Menu {index}", "url": f"https://www.wayfair.com/nav/{index}"} for index in range(pad)]})
+    script = f'<script>self.__next_f.push([1,{json.dumps(f"0a:{filler}" + chr(10))}])</script>'.encode("utf-8")
+    for file_name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, file_name), "rb") as page_file:
+            content = page_file.read()
+        if pad:
+            start = content.index(b"</script>") + len(b"</script>")
+            content = content[:start] + script + content[start:]
+        yield file_name, content
+
+
+def parse_fixture(scraper, content, use_extractor):
+    response = requests.Response()
+    response.status_code = 200
+    response.encoding = "utf-8"
+    response._content = content
+    scraper.use_extractor = use_extractor
+    scraper.history = DedupStore()
+    scraper.counts["Kids Beds"] = 0
+    rows = scraper.rows
+    scraper.parse_response("https://www.wayfair.com/baby-kids/sb0/kids-beds-c1870.html", "Kids Beds", response)
+    return scraper.rows - rows
+
+
+def bench_parsers(scraper, pads, repeat):
+    for pad in pads:
+        for file_name, content in wayfair_fixture_pages(pad):
+            rows = {}
+            for label, use_extractor in (("extractor", True), ("split", False)):
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    rows[label] = parse_fixture(scraper, content, use_extractor)
+                seconds = (time.perf_counter() - started) / repeat
+                tracemalloc.start()
+                parse_fixture(scraper, content, use_extractor)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(
+                    f"bench: parse {label} {file_name} ({len(content) >> 10} KB) - {rows[label]} rows, "
+                    f"{seconds * 1000:.2f} ms per page, peak {peak / 2 ** 20:.1f} MB"
+                )
+            if rows["extractor"] != rows["split"]:
+                print(f"bench: parse {file_name} - OUTPUT CHANGED ({rows['extractor']} rows extracted, {rows['split']} split)")
+
+
+def bench_parse(pads=(0, 20000), repeat=20):
+    run_scraper(WayfairScraper, run=lambda scraper: bench_parsers(scraper, pads, repeat), counts={"Kids Beds": 0})
+
+
+def facet_response(color, price, page, colors, prices, pages, page_size):
+    leaf = pages * page_size
+    if color is None:
+        return leaf * prices * colors, [{"displayName": "Color", "attributeGroupId": "7", "values": [
+            {"attributeId": str(index), "count": leaf * prices} for index in range(colors)
+        ]}], []
+    if price is None:
+        return leaf * prices, [{"displayName": "Price", "values": [
+            {"min": index * 100, "max": index * 100 + 99, "count": leaf} for index in range(prices)
+        ]}], []
+    if page > pages:
+        return leaf, [], []
+    return leaf, [], [f"{color}x{price}x{page}x{index}" for index in range(page_size)]
+
+
+def facet_stub(colors, prices, pages):
+    def respond(path, headers, body):
+        if path.startswith("/reviews/"):
+            ids = re.split("%2C|,", path[len("/reviews/"):])
+            results = [{"page_id": product_id, "rollup": {"review_count": 5, "average_rating": 4.5}} for product_id in ids]
+            return 200, "application/json", json.dumps({"results": results}).encode("utf-8")
+        if path.startswith("/vsearch"):
+            query = json.loads(body)["query"]["productSearchQuery"]
+            attributes = list(query["attributes"].values())
+            color = attributes[0]["values"][0] if attributes else None
+            price = query["ranges"]["price"]["min"] if query["ranges"] else None
+            count, facets, keys = facet_response(color, price, query["searchParameters"]["page"], colors, prices, pages, OverstockScraper.page_size)
+            products = [{"url": f"bench-sofa-{key}", "title": "Sofa", "pricing": {"minPrice": 499}} for key in keys]
+            return 200, "application/json", json.dumps({"resultCount": count, "facets": facets, "products": products}).encode("utf-8")
+        url = headers.get("request-url", "")
+        color = re.search(r"&a7=(\d+)", url)
+        price = re.search(r"&price=(\d+):", url)
+        page = re.search(r"&page=(\d+)", url)
+        count, facets, keys = facet_response(
+            color and color.group(1), price and price.group(1), int(page.group(1)) if page else 1,
+            colors, prices, pages, BedbathandbeyondScraper.page_size
+        )
+        products = [
+            {"id": key, "name": "Sofa", "urls": {"productPage": f"/p/{key}"}, "pricing": {"base": {"price": "$499"}}, "reviews": {"count": 5, "rating": 4.5}}
+            for key in keys
+        ]
+        return 200, "application/json", json.dumps({"pageData": {"resultCount": count, "facets": facets, "products": products}}).encode("utf-8")
+    return respond
+
+
+def bench_facets(levels=(1, 8, 32), latency=0.05, colors=6, prices=4, pages=3):
+    if aiohttp is None:
+        print("bench: facets - the stub server needs aiohttp installed")
+        return
+    with StubServer(facet_stub(colors, prices, pages), latency) as server:
+        retailers = {
+            "bedbath": (BedbathandbeyondScraper, lambda self: [self.category_task("Sofas", "https://www.bedbathandbeyond.com/c/sofas?x=1", "Color")]),
+            "overstock": (OverstockScraper, lambda self: [self.category_task("Sofas", self.search_payload("1"), "Color")]),
+        }
+        for retailer, (cls, discover) in retailers.items():
+            for level in levels:
+                def run(scraper):
+                    if retailer == "overstock":
+                        scraper.reviews.review_url = f"{server.url}/reviews/{{}}"
+                    scraper.run()
+
+                seconds, requests_made, rows = run_scraper(
+                    cls,
+                    run=run,
+                    api_url=f"{server.url}/vsearch" if retailer == "overstock" else f"{server.url}/kronos",
+                    max_concurrency=level,
+                    review_concurrency=level,
+                    early_stop=False,
+                    discover=discover,
+                )
+                print(
+                    f"bench: facets {retailer} x{level} - {requests_made} requests, {rows} rows in {seconds:.2f}s, "
+                    f"{requests_made / seconds:.1f} requests/s at {latency * 1000:.0f} ms latency"
+                )
+
+
+def bench_runtimes(latency=0.05, colors=8, prices=8, pages=2, threads=64):
+    if aiohttp is None:
+        print("bench: runtimes - the stub server and the async runtime need aiohttp installed")
+        return
+    runtimes = {
+        "sync": ({"max_concurrency": 1}, None),
+        "threaded": ({"max_concurrency": threads}, None),
+        "async": ({}, lambda scraper: asyncio.run(scraper.async_run())),
+    }
+    with StubServer(facet_stub(colors, prices, pages), latency) as server:
+        for runtime, (settings, run) in runtimes.items():
+            seconds, requests_made, rows = run_scraper(
+                BedbathandbeyondScraper,
+                run=run,
+                api_url=f"{server.url}/kronos",
+                early_stop=False,
+                discover=lambda self: [self.category_task("Sofas", "https://www.bedbathandbeyond.com/c/sofas?x=1", "Color")],
+                **settings,
+            )
+            print(
+                f"bench: runtime {runtime} - {requests_made} requests, {rows} rows in {seconds:.2f}s, "
+                f"{requests_made / seconds:.1f} requests/s at {latency * 1000:.0f} ms latency"
+            )
+
+
+BENCHES = {
+    "sinks": bench_sinks,
+    "concurrency": bench_concurrency,
+    "dedup": bench_dedup,
+    "parse": bench_parse,
+    "facets": bench_facets,
+    "runtimes": bench_runtimes,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks against local stubs, no network needed.")
+    parser.add_argument("bench", nargs="*", help=f"benchmarks to run, all by default: {', '.join(BENCHES)}")
+    args = parser.parse_args()
+    unknown = [name for name in args.bench if name not in BENCHES]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+    for name in args.bench or BENCHES:
+        BENCHES[name]()
@@ -0,0 +1,338 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+
+class DedupStore:
+    def __init__(self, compact=False):
+        self.compact = compact
+        self.keys = set()
+        self.lock = threading.Lock()
+
+    def key(self, value):
+        if self.compact:
+            digest = hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+            return int.from_bytes(digest, "little")
+        return value
+
+    def __contains__(self, value):
+        return self.key(value) in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, value):
+        key = self.key(value)
+        with self.lock:
+            if key in self.keys:
+                return False
+            self.keys.add(key)
+            return True
+
+    def add_many(self, values):
+        keys = [self.key(value) for value in values]
+        added = []
+        with self.lock:
+            for key in keys:
+                added.append(key not in self.keys)
+                self.keys.add(key)
+        return added
+
+
+class Checkpoint:
+    def __init__(self, path, resume=False):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS units (unit TEXT PRIMARY KEY)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS positions (owner TEXT PRIMARY KEY, position TEXT)")
+        if not resume:
+            self.connection.execute("DELETE FROM units")
+            self.connection.execute("DELETE FROM seen")
+            self.connection.execute("DELETE FROM positions")
+        self.connection.commit()
+        self.completed = set(row[0] for row in self.connection.execute("SELECT unit FROM units"))
+
+    def unit_key(self, unit):
+        return "\t".join(str(part) for part in unit)
+
+    def is_done(self, *unit):
+        return self.unit_key(unit) in self.completed
+
+    def mark_done(self, *unit, keys=(), position=None):
+        key = self.unit_key(unit)
+        with self.lock:
+            self.completed.add(key)
+            self.connection.executemany("INSERT OR IGNORE INTO seen VALUES (?)", [(str(seen),) for seen in keys])
+            self.connection.execute("INSERT OR IGNORE INTO units VALUES (?)", (key,))
+            if position is not None:
+                self.connection.execute("INSERT OR REPLACE INTO positions VALUES ('', ?)", (json.dumps(position),))
+            self.connection.commit()
+
+    def position(self):
+        with self.lock:
+            row = self.connection.execute("SELECT position FROM positions WHERE owner = ''").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def seen_keys(self):
+        for row in self.connection.execute("SELECT key FROM seen"):
+            yield row[0]
+
+    def close(self):
+        self.connection.close()
+
+
+class DiscoveryCache:
+    def __init__(self, path, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS entries (entry TEXT PRIMARY KEY, value TEXT, resolved REAL)")
+        self.connection.commit()
+
+    def get(self, entry):
+        with self.lock:
+            row = self.connection.execute("SELECT value, resolved FROM entries WHERE entry = ?", (entry,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def put(self, entry, value):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (entry, json.dumps(value), time.time()))
+            self.connection.commit()
+
+    def invalidate(self, entry):
+        with self.lock:
+            self.connection.execute("DELETE FROM entries WHERE entry = ?", (entry,))
+            self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+class Snapshot:
+    fields = ("Price", "Reviews", "Rating")
+
+    def __init__(self, path, resume=False):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS products "
+            "(key TEXT PRIMARY KEY, url TEXT, category TEXT, price TEXT, reviews TEXT, rating TEXT, run INTEGER)"
+        )
+        self.connection.execute("CREATE TABLE IF NOT EXISTS truncated (run INTEGER, category TEXT, PRIMARY KEY (run, category))")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS runs (run INTEGER PRIMARY KEY)")
+        self.run = self.connection.execute("SELECT COALESCE(MAX(run), 0) FROM runs").fetchone()[0]
+        if not resume or not self.run:
+            self.run += 1
+            self.connection.execute("INSERT INTO runs VALUES (?)", (self.run,))
+        self.connection.commit()
+        self.values = {
+            key: self.digest(values)
+            for key, *values in self.connection.execute("SELECT key, price, reviews, rating FROM products")
+        }
+
+    def digest(self, values):
+        return tuple(zlib.crc32(str(value).encode("utf-8")) for value in values)
+
+    def matches(self, key, values):
+        known = self.values.get(str(key))
+        if known is None:
+            return False
+        return all(
+            known[index] == zlib.crc32(str(values[field]).encode("utf-8"))
+            for index, field in enumerate(self.fields) if field in values
+        )
+
+    def update(self, key, values):
+        key = str(key)
+        row = [str(values.get(field, "")) for field in self.fields]
+        digest = self.digest(row)
+        with self.lock:
+            known = self.values.get(key)
+            self.values[key] = digest
+            self.connection.execute(
+                "INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, values.get("URL", ""), values.get("Category", ""), *row, self.run)
+            )
+        if known is None:
+            return "new"
+        return "changed" if known != digest else "unchanged"
+
+    def truncate(self, category=None):
+        with self.lock:
+            self.connection.execute("INSERT OR IGNORE INTO truncated VALUES (?, ?)", (self.run, category))
+
+    def disappeared(self):
+        query = (
+            "FROM products WHERE run < :run "
+            "AND category IN (SELECT category FROM products WHERE run = :run) "
+            "AND category NOT IN (SELECT category FROM truncated WHERE run = :run AND category IS NOT NULL) "
+            "AND NOT EXISTS (SELECT 1 FROM truncated WHERE run = :run AND category IS NULL)"
+        )
+        with self.lock:
+            rows = self.connection.execute(f"SELECT key, url, category, price, reviews, rating {query}", {"run": self.run}).fetchall()
+            self.connection.execute(f"DELETE {query}", {"run": self.run})
+        for row in rows:
+            self.values.pop(row[0], None)
+        return rows
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+class WorkQueue:
+    lease_seconds = 300
+    max_attempts = 3
+
+    def __init__(self, path, owner):
+        self.owner = owner
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS tasks "
+            "(key TEXT PRIMARY KEY, task TEXT, state TEXT, owner TEXT, lease_until REAL, attempts INTEGER, lease TEXT)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS tasks_lease ON tasks (lease)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS units (unit TEXT PRIMARY KEY)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY, lease TEXT)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS positions (owner TEXT PRIMARY KEY, position TEXT)")
+        self.connection.commit()
+        self.leases = set()
+        self.stopped = threading.Event()
+        threading.Thread(target=self.renew, daemon=True).start()
+
+    def unit_key(self, unit):
+        return "\t".join(str(part) for part in unit)
+
+    def reset(self):
+        with self.lock:
+            for table in ("tasks", "units", "seen", "positions"):
+                self.connection.execute(f"DELETE FROM {table}")
+            self.connection.commit()
+
+    def publish(self, tasks):
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO tasks VALUES (?, ?, 'ready', NULL, 0, 0, NULL)",
+                [(self.unit_key(("task", task)), task) for task in tasks]
+            )
+            self.connection.commit()
+
+    def claim(self):
+        with self.lock:
+            while True:
+                now = time.time()
+                row = self.connection.execute(
+                    "SELECT key, task FROM tasks WHERE state = 'ready' "
+                    "OR (state = 'leased' AND lease_until < ? AND attempts < ?) LIMIT 1",
+                    (now, self.max_attempts)
+                ).fetchone()
+                if row is None:
+                    return None
+
+                lease = uuid.uuid4().hex
+                claimed = self.connection.execute(
+                    "UPDATE tasks SET state = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1, lease = ? "
+                    "WHERE key = ? AND (state = 'ready' OR (state = 'leased' AND lease_until < ?))",
+                    (self.owner, now + self.lease_seconds, lease, row[0], now)
+                ).rowcount
+                self.connection.commit()
+                if claimed:
+                    self.leases.add(row[0])
+                    return row[1], lease
+
+    def renew(self):
+        while not self.stopped.wait(self.lease_seconds / 3):
+            with self.lock:
+                until = time.time() + self.lease_seconds
+                self.connection.executemany(
+                    "UPDATE tasks SET lease_until = ? WHERE key = ? AND owner = ? AND state = 'leased'",
+                    [(until, key, self.owner) for key in self.leases]
+                )
+                self.connection.commit()
+
+    def release(self, task):
+        key = self.unit_key(("task", task))
+        with self.lock:
+            self.leases.discard(key)
+            self.connection.execute(
+                "UPDATE tasks SET state = CASE WHEN attempts < ? THEN 'ready' ELSE 'failed' END, owner = NULL "
+                "WHERE key = ? AND owner = ?",
+                (self.max_attempts, key, self.owner)
+            )
+            self.connection.commit()
+
+    def remaining(self):
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM tasks WHERE state = 'ready' "
+                "OR (state = 'leased' AND (lease_until >= ? OR attempts < ?))",
+                (time.time(), self.max_attempts)
+            ).fetchone()[0]
+
+    def states(self):
+        with self.lock:
+            return dict(self.connection.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall())
+
+    def is_done(self, *unit):
+        with self.lock:
+            return self.connection.execute("SELECT 1 FROM units WHERE unit = ?", (self.unit_key(unit),)).fetchone() is not None
+
+    def mark_done(self, *unit, keys=(), position=None):
+        key = self.unit_key(unit)
+        with self.lock:
+            self.leases.discard(key)
+            self.connection.executemany("INSERT OR REPLACE INTO seen VALUES (?, NULL)", [(str(seen),) for seen in keys])
+            self.connection.execute("INSERT OR IGNORE INTO units VALUES (?)", (key,))
+            self.connection.execute("UPDATE tasks SET state = 'done' WHERE key = ?", (key,))
+            if position is not None:
+                self.connection.execute("INSERT OR REPLACE INTO positions VALUES (?, ?)", (self.owner, json.dumps(position)))
+            self.connection.commit()
+
+    def position(self):
+        with self.lock:
+            row = self.connection.execute("SELECT position FROM positions WHERE owner = ?", (self.owner,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add_seen_many(self, keys, lease):
+        with self.lock:
+            now = time.time()
+            added = []
+            for key in keys:
+                if self.connection.execute("INSERT OR IGNORE INTO seen VALUES (?, ?)", (str(key), lease)).rowcount:
+                    added.append(True)
+                    continue
+                added.append(self.connection.execute(
+                    "UPDATE seen SET lease = ? WHERE key = ? AND lease IS NOT NULL AND lease NOT IN "
+                    "(SELECT lease FROM tasks WHERE state = 'leased' AND lease_until >= ? AND lease IS NOT NULL)",
+                    (lease, str(key), now)
+                ).rowcount == 1)
+            self.connection.commit()
+            return added
+
+    def seen_keys(self):
+        return iter(())
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+
+    def close(self):
+        self.stopped.set()
+        self.commit()
+        self.connection.close()
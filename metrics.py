@@ -0,0 +1,148 @@
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+
+class Metrics:
+    buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"buckets": [0] * (len(self.buckets) + 1), "count": 0, "sum": 0.0}
+            index = 0
+            while index < len(self.buckets) and value > self.buckets[index]:
+                index += 1
+            histogram["buckets"][index] += 1
+            histogram["count"] += 1
+            histogram["sum"] += value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def quantile(self, histogram, q):
+        rank = q * histogram["count"]
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), histogram["buckets"]):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def label_text(self, labels):
+        return ",".join(f'{key}="{value}"' for key, value in labels)
+
+    def summary(self):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: dict(value, buckets=list(value["buckets"])) for key, value in self.histograms.items()}
+        return {
+            "counters": {f"{name}{{{self.label_text(labels)}}}": value for (name, labels), value in sorted(counters.items())},
+            "histograms": {
+                f"{name}{{{self.label_text(labels)}}}": {
+                    "count": histogram["count"],
+                    "sum": round(histogram["sum"], 6),
+                    "p50": self.quantile(histogram, 0.5),
+                    "p95": self.quantile(histogram, 0.95),
+                }
+                for (name, labels), histogram in sorted(histograms.items())
+            },
+        }
+
+    def prometheus(self, prefix, **labels):
+        extra = tuple(sorted(labels.items()))
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, dict(value, buckets=list(value["buckets"]))) for key, value in self.histograms.items())
+
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                typed.add(name)
+            lines.append(f"{prefix}_{name}_total{{{self.label_text(extra + labels)}}} {value}")
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {prefix}_{name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), histogram["buckets"]):
+                cumulative += count
+                lines.append(f"{prefix}_{name}_bucket{{{self.label_text(extra + labels + (('le', bound),))}}} {cumulative}")
+            lines.append(f"{prefix}_{name}_sum{{{self.label_text(extra + labels)}}} {histogram['sum']}")
+            lines.append(f"{prefix}_{name}_count{{{self.label_text(extra + labels)}}} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def profiling(profile, name, print_out):
+    if profile == "cprofile":
+        profilers = [cProfile.Profile()]
+        lock = threading.Lock()
+        per_thread = sys.version_info < (3, 12)
+
+        def start_thread(*_):
+            profiler = cProfile.Profile()
+            with lock:
+                profilers.append(profiler)
+            profiler.enable()
+
+        if per_thread:
+            threading.setprofile(start_thread)
+        profilers[0].enable()
+        try:
+            yield
+        finally:
+            profilers[0].disable()
+            if per_thread:
+                threading.setprofile(None)
+            with lock:
+                for profiler in profilers[1:]:
+                    profiler.disable()
+            stream = io.StringIO()
+            stream.write(f"profile: {len(profilers)} profilers, one per thread\n" if per_thread else "profile: one profiler for all threads\n")
+            stats = pstats.Stats(*profilers, stream=stream)
+            stats.dump_stats(f"{name}.prof")
+            stats.sort_stats("cumulative").print_stats(25)
+            print_out(stream.getvalue())
+    elif profile == "pyinstrument" and pyinstrument is not None:
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(f"{name}.profile.html", "w", encoding="utf-8") as profile_file:
+                profile_file.write(profiler.output_html())
+            print_out(profiler.output_text())
+    else:
+        if profile:
+            print_out(f"profile: {profile} is not available")
+        yield
@@ -0,0 +1,701 @@
+import asyncio
+import codecs
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import zlib
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.connectionpool import HTTPSConnectionPool
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.ssl_ import create_urllib3_context
+from collections import deque, OrderedDict
+from concurrent.futures import Future
+from itertools import islice
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    from urllib3.http2.connection import HTTP2Connection
+except ImportError:
+    HTTP2Connection = None
+
+SUPPORTED_ENCODINGS = set(encoding.strip() for encoding in ACCEPT_ENCODING.split(","))
+
+
+class HTTP2ConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = HTTP2Connection
+
+
+class HTTP2Adapter(HTTPAdapter):
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        context = create_urllib3_context()
+        context.set_alpn_protocols(["h2"])
+        super().init_poolmanager(connections, maxsize, block, ssl_context=context, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {**self.poolmanager.pool_classes_by_scheme, "https": HTTP2ConnectionPool}
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire(self):
+        time.sleep(self.reserve())
+
+
+class EndpointPool:
+    decay = 0.2
+
+    def __init__(self, values, cooldown=30.0, cooldown_max=600.0, labels=None):
+        labels = labels or [f"{urlsplit(value).netloc} #{index}" for index, value in enumerate(values)]
+        self.members = [
+            {"value": value, "label": label, "in_flight": 0, "latency": 0.0,
+             "error_rate": 0.0, "failures": 0, "until": 0.0, "requests": 0, "errors": 0, "blocks": 0}
+            for value, label in zip(values, labels)
+        ]
+        self.cooldown = cooldown
+        self.cooldown_max = cooldown_max
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            ready = [member for member in self.members if member["until"] <= now]
+            if ready:
+                member = min(ready, key=lambda member: ((member["in_flight"] + 1) * member["latency"] / (1 - 0.9 * member["error_rate"]), member["requests"]))
+            else:
+                member = min(self.members, key=lambda member: member["until"])
+            member["in_flight"] += 1
+            member["requests"] += 1
+            return member, max(0.0, member["until"] - now)
+
+    def release(self, member, seconds, ok=True, blocked=False):
+        with self.lock:
+            member["in_flight"] -= 1
+            member["latency"] += self.decay * (seconds - member["latency"]) if member["latency"] else seconds
+            member["error_rate"] += self.decay * ((0.0 if ok else 1.0) - member["error_rate"])
+            if ok:
+                member["failures"] = 0
+                return
+            member["errors"] += 1
+            member["blocks"] += blocked
+            member["failures"] += 1
+            member["until"] = time.monotonic() + min(self.cooldown_max, self.cooldown * 2 ** (member["failures"] - 1))
+
+    def report(self):
+        with self.lock:
+            return [
+                f"endpoints: {member['label']} - {member['requests']} requests, {member['errors']} failed, "
+                f"{member['blocks']} blocked, {member['latency']:.2f}s average"
+                for member in self.members
+            ]
+
+
+class CreditScheduler:
+    decay = 0.5
+
+    def __init__(self, budget=0, cost=1, target=0):
+        self.budget = budget
+        self.cost = cost
+        self.target = target
+        self.spent = 0
+        self.projected = 0
+        self.dropped = 0
+        self.listings = {}
+        self.products = {}
+        self.lock = threading.Lock()
+
+    def charge(self):
+        with self.lock:
+            self.spent += self.cost
+
+    def affordable(self):
+        with self.lock:
+            return not self.budget or self.spent + self.cost <= self.budget
+
+    def reached(self, category):
+        with self.lock:
+            return bool(self.target) and self.products.get(category, 0) >= self.target
+
+    def plan(self, listing, category, pages, products):
+        with self.lock:
+            self.listings[listing] = {"category": category, "pages": pages, "yield": float(products)}
+            self.products[category] = self.products.get(category, 0) + products
+            self.projected += (pages + 1) * self.cost
+
+    def observe(self, listing, products):
+        with self.lock:
+            state = self.listings[listing]
+            state["pages"] = max(0, state["pages"] - 1)
+            state["yield"] += self.decay * (products - state["yield"])
+            self.products[state["category"]] = self.products.get(state["category"], 0) + products
+
+    def priority(self, listing):
+        with self.lock:
+            state = self.listings.get(listing)
+            return state["yield"] if state else 0.0
+
+    def grant(self, listing, pages):
+        with self.lock:
+            state = self.listings[listing]
+            pages = min(pages, state["pages"])
+            if self.target and self.products.get(state["category"], 0) >= self.target:
+                state["pages"] = 0
+                return 0
+            if self.budget:
+                ahead = sum(
+                    other["pages"] for key, other in self.listings.items()
+                    if other["yield"] > state["yield"] or (other["yield"] == state["yield"] and key < listing)
+                )
+                pages = max(0, min(pages, (self.budget - self.spent) // self.cost - ahead))
+            if not pages:
+                self.dropped += state["pages"]
+                state["pages"] = 0
+            return pages
+
+    def finish(self, listing):
+        with self.lock:
+            if listing in self.listings:
+                self.listings[listing]["pages"] = 0
+
+    def report(self):
+        with self.lock:
+            products = sum(self.products.values())
+            return (
+                f"credits: spent {self.spent} of {self.budget or 'unlimited'}, "
+                f"projected {self.projected} for {len(self.listings)} listings, "
+                f"{self.dropped * self.cost} held back from low-yield pages, "
+                f"{products} qualifying products ({products / self.spent if self.spent else 0:.2f} per credit)"
+            )
+
+
+class CacheMiss(Exception):
+    pass
+
+
+class ResponseCache:
+    def __init__(self, directory, ttl=86400, max_bytes=2 << 30, offline=False):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(size for _, size, _ in self.entries())
+
+    def key(self, method, url, body=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        digest = hashlib.sha256(f"{method.upper()}\n{url}\n".encode("utf-8"))
+        digest.update(body or b"")
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def entries(self):
+        for root, _, files in os.walk(self.directory):
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def get(self, method, url, body=None):
+        path = self.path(self.key(method, url, body))
+        try:
+            with open(path, "rb") as cache_file:
+                data = zlib.decompress(cache_file.read())
+        except (OSError, zlib.error):
+            if self.offline:
+                raise CacheMiss(f"{method} {url}")
+            self.misses += 1
+            return None
+
+        header, content = data.split(b"\n", 1)
+        entry = json.loads(header)
+        if not self.offline and time.time() - entry["created"] > self.ttl:
+            self.misses += 1
+            return None
+
+        os.utime(path)
+        self.hits += 1
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.url = entry["url"]
+        response.encoding = entry["encoding"]
+        response._content = content
+        response._content_consumed = True
+        return response
+
+    def put(self, method, url, body, response):
+        if response.status_code != 200:
+            return
+
+        headers = {
+            key: value for key, value in response.headers.items()
+            if key.lower() not in ("content-encoding", "content-length", "transfer-encoding")
+        }
+        header = json.dumps({
+            "url": response.url,
+            "status": response.status_code,
+            "headers": headers,
+            "encoding": response.encoding,
+            "created": time.time(),
+        }).encode("utf-8")
+        data = zlib.compress(header + b"\n" + response.content, 6)
+
+        path = self.path(self.key(method, url, body))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as cache_file:
+            cache_file.write(data)
+        os.replace(temp_path, path)
+
+        with self.lock:
+            self.size += len(data)
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        entries = sorted(self.entries())
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+                self.size -= size
+            except OSError:
+                pass
+
+
+def canonical_url(url):
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, query, ""))
+
+
+class Coalescer:
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.done = OrderedDict()
+        self.hits = 0
+
+    def lookup(self, key, new_future):
+        with self.lock:
+            if key in self.done:
+                self.done.move_to_end(key)
+                self.hits += 1
+                return self.done[key], None
+            if key in self.pending:
+                self.hits += 1
+                return self.pending[key], False
+            future = self.pending[key] = new_future()
+            return future, True
+
+    def finish(self, key, response):
+        with self.lock:
+            del self.pending[key]
+            if response is not None and response.status_code == 200:
+                self.done[key] = response
+                while len(self.done) > self.max_entries:
+                    self.done.popitem(last=False)
+
+    def fetch(self, key, send):
+        found, owner = self.lookup(key, Future)
+        if owner is None:
+            return found
+        if not owner:
+            return found.result()
+        try:
+            response = send()
+        except Exception as e:
+            self.finish(key, None)
+            found.set_exception(e)
+            raise
+        self.finish(key, response)
+        found.set_result(response)
+        return response
+
+    async def async_fetch(self, key, send):
+        found, owner = self.lookup(key, asyncio.get_running_loop().create_future)
+        if owner is None:
+            return found
+        if not owner:
+            return await asyncio.shield(found)
+        try:
+            response = await send()
+        except asyncio.CancelledError:
+            self.finish(key, None)
+            found.cancel()
+            raise
+        except Exception as e:
+            self.finish(key, None)
+            found.set_exception(e)
+            found.exception()
+            raise
+        self.finish(key, response)
+        found.set_result(response)
+        return response
+
+
+class Fetch:
+    def __init__(self, method, url, **kwargs):
+        self.method = method
+        self.url = url
+        self.kwargs = kwargs
+
+
+class Requester:
+    def pool_size(self):
+        return max([self.max_concurrency] + list(self.host_limits.values()))
+
+    def get_session(self):
+        pool_size = self.pool_size()
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        if self.use_http2:
+            if HTTP2Connection is None:
+                self.print_out("init: HTTP/2 needs urllib3 2.3+ with h2 installed, using HTTP/1.1")
+            else:
+                session.mount("https://", HTTP2Adapter(pool_connections=16, pool_maxsize=pool_size))
+        return session
+
+    def accept_encoding(self, headers):
+        for key, value in headers.items():
+            if key.lower() == "accept-encoding":
+                encodings = [encoding.strip() for encoding in value.split(",")]
+                supported = ", ".join(encoding for encoding in encodings if encoding in SUPPORTED_ENCODINGS)
+                if supported != value:
+                    headers = {**headers, key: supported or "identity"}
+                break
+        return headers
+
+    def transport_stats(self):
+        stats = {}
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                host = f"{pool.scheme}://{pool.host}"
+                connections, requests_made = stats.get(host, (0, 0))
+                stats[host] = (connections + pool.num_connections, requests_made + pool.num_requests)
+        return stats
+
+    def request(self, method, url, category=None, **kwargs):
+        if self.cache:
+            body = self.cache_body(kwargs)
+            response = self.cache.get(method, url, body)
+            if response is not None and not self.blocked(response):
+                return response
+
+        host = urlsplit(url).netloc
+        bucket = self.get_bucket(host)
+        with self.lock:
+            if host not in self.host_slots:
+                self.host_slots[host] = threading.BoundedSemaphore(self.host_limits.get(host, self.max_concurrency))
+            slot = self.host_slots[host]
+
+        if kwargs.get("headers"):
+            kwargs["headers"] = self.accept_encoding(kwargs["headers"])
+        kwargs.setdefault("timeout", self.request_timeout)
+        stream_slot = self.stream_slot(host) if kwargs.get("stream") else None
+        if stream_slot is None:
+            kwargs["stream"] = False
+
+        for attempt in range(self.max_retry_cnt + 1):
+            if bucket:
+                bucket.acquire()
+            self.count_request(category, url)
+            target, routed, members, delay = self.route(url, kwargs)
+            if delay:
+                time.sleep(delay)
+
+            response = error = None
+            try:
+                with slot:
+                    started = time.perf_counter()
+                    response = self.session.request(method, target, **routed)
+            except requests.RequestException as e:
+                error = e
+            self.record_response(host, started, response, kwargs.get("stream", False))
+            blocked = self.release_members(members, started, response, kwargs.get("stream", False))
+
+            if response is not None and response.status_code not in self.retry_statuses and not blocked:
+                if self.cache and not kwargs["stream"]:
+                    self.cache.put(method, url, body, response)
+                response.stream_slot = stream_slot
+                return response
+
+            if attempt == self.max_retry_cnt or not self.spend_retry():
+                if response is not None:
+                    response.stream_slot = stream_slot
+                    return response
+                if stream_slot is not None:
+                    stream_slot.release()
+                raise error
+
+            delay = 0 if blocked and members else self.backoff(attempt, response)
+            self.print_out(f"request: retry {attempt + 1} in {delay:.1f}s - {self.retry_reason(response, error, blocked)} - {url}")
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+
+    async def async_request(self, method, url, category=None, **kwargs):
+        if self.cache:
+            body = self.cache_body(kwargs)
+            response = self.cache.get(method, url, body)
+            if response is not None and not self.blocked(response):
+                return response
+
+        host = urlsplit(url).netloc
+        bucket = self.get_bucket(host)
+        if host not in self.async_slots:
+            self.async_slots[host] = asyncio.Semaphore(self.host_limits.get(host, self.async_concurrency))
+        slot = self.async_slots[host]
+
+        if kwargs.get("headers"):
+            kwargs["headers"] = self.accept_encoding(kwargs["headers"])
+        kwargs.pop("stream", None)
+        kwargs.setdefault("timeout", aiohttp.ClientTimeout(total=self.request_timeout))
+
+        for attempt in range(self.max_retry_cnt + 1):
+            if bucket:
+                await asyncio.sleep(bucket.reserve())
+            self.count_request(category, url)
+            target, routed, members, delay = self.route(url, kwargs)
+            if delay:
+                await asyncio.sleep(delay)
+
+            response = error = None
+            try:
+                async with slot:
+                    started = time.perf_counter()
+                    async with self.async_session.request(method, target, **routed) as async_response:
+                        response = requests.Response()
+                        response.status_code = async_response.status
+                        response.headers = CaseInsensitiveDict(async_response.headers)
+                        response.url = str(async_response.url)
+                        response.encoding = async_response.charset
+                        response._content = await async_response.read()
+                        response._content_consumed = True
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+            self.record_response(host, started, response)
+            blocked = self.release_members(members, started, response)
+
+            if response is not None and response.status_code not in self.retry_statuses and not blocked:
+                if self.cache:
+                    self.cache.put(method, url, body, response)
+                return response
+
+            if attempt == self.max_retry_cnt or not self.spend_retry():
+                if response is not None:
+                    return response
+                raise error
+
+            delay = 0 if blocked and members else self.backoff(attempt, response)
+            self.print_out(f"request: retry {attempt + 1} in {delay:.1f}s - {self.retry_reason(response, error, blocked)} - {url}")
+            await asyncio.sleep(delay)
+
+    def route(self, url, kwargs):
+        members = []
+        delay = 0
+        if self.endpoints is not None and url.startswith(self.scraper_api):
+            member, delay = self.endpoints.acquire()
+            url = member["value"] + url[len(self.scraper_api):]
+            members.append((self.endpoints, member))
+        if self.cookie_pool is not None:
+            for key in kwargs.get("headers") or {}:
+                if key.lower() == "cookie":
+                    member, wait = self.cookie_pool.acquire()
+                    kwargs = {**kwargs, "headers": {**kwargs["headers"], key: member["value"]}}
+                    members.append((self.cookie_pool, member))
+                    delay = max(delay, wait)
+                    break
+        return url, kwargs, members, delay
+
+    def release_members(self, members, started, response, streamed=False):
+        blocked = response is not None and response.status_code == 200 and not streamed and self.blocked(response)
+        ok = response is not None and response.status_code not in self.retry_statuses and not blocked
+        for pool, member in members:
+            pool.release(member, time.perf_counter() - started, ok, blocked)
+            if blocked:
+                self.metrics.inc("blocked_responses", endpoint=member["label"])
+        if blocked and not members:
+            self.metrics.inc("blocked_responses")
+        return blocked
+
+    def retry_reason(self, response, error, blocked):
+        if blocked:
+            return "blocked"
+        return response.status_code if response is not None else error
+
+    def blocked(self, response):
+        return False
+
+    def cache_body(self, kwargs):
+        body = kwargs.get("data")
+        if not self.cache_vary:
+            return body
+        headers = {key.lower(): value for key, value in (kwargs.get("headers") or {}).items()}
+        return "\n".join([body or ""] + [f"{name}: {headers.get(name, '')}" for name in self.cache_vary])
+
+    def record_response(self, host, started, response, streamed=False):
+        self.metrics.observe("request_seconds", time.perf_counter() - started, host=host)
+        if response is None:
+            self.metrics.inc("request_errors", host=host)
+            return
+        self.metrics.inc("responses", host=host, status=response.status_code)
+        if not streamed:
+            self.metrics.inc("response_bytes", len(response.content), host=host)
+
+    def iter_text(self, response):
+        decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+        host = urlsplit(response.url or "").netloc
+        streamed = response.raw is not None and getattr(response, "stream_slot", None) is not None
+        for chunk in response.iter_content(self.stream_chunk_size):
+            if streamed:
+                self.metrics.inc("response_bytes", len(chunk), host=host)
+            yield decoder.decode(chunk)
+        yield decoder.decode(b"", final=True)
+
+    def stream_slot(self, host):
+        with self.lock:
+            if host not in self.stream_slots:
+                self.stream_slots[host] = threading.BoundedSemaphore(self.pool_size())
+            slot = self.stream_slots[host]
+        if slot.acquire(blocking=False):
+            return slot
+        self.metrics.inc("stream_fallbacks", host=host)
+        return None
+
+    def close_response(self, response):
+        slot = getattr(response, "stream_slot", None)
+        response.stream_slot = None
+        if slot is not None:
+            slot.release()
+        response.close()
+
+    def get_bucket(self, host):
+        with self.lock:
+            if host not in self.buckets:
+                rate = self.rate_limits.get(host, self.default_rate)
+                self.buckets[host] = TokenBucket(rate, self.host_limits.get(host, self.max_concurrency)) if rate else None
+            return self.buckets[host]
+
+    def count_request(self, category, url=""):
+        with self.lock:
+            self.request_counts[category] = self.request_counts.get(category, 0) + 1
+        if self.credits and url.startswith(self.scraper_api):
+            self.credits.charge()
+
+    def backoff(self, attempt, response=None):
+        if response is not None:
+            try:
+                return min(self.backoff_max, float(response.headers.get("Retry-After")))
+            except (TypeError, ValueError):
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def spend_retry(self):
+        with self.lock:
+            budget = self.min_retry_budget + self.retry_budget * sum(self.request_counts.values())
+            if self.retries >= budget:
+                return False
+            self.retries += 1
+            return True
+
+    def report_requests(self):
+        for category, count in sorted(self.request_counts.items(), key=lambda item: str(item[0])):
+            self.print_out(f"requests: {category} - {count}")
+        self.print_out(f"requests: total - {sum(self.request_counts.values())}, retries - {self.retries}")
+        if self.coalescer and (self.coalescer.hits or self.claimed_queries):
+            skipped = sum(value for (name, _), value in self.metrics.counters.items() if name == "coalesced_queries")
+            self.print_out(f"requests: {self.coalescer.hits} shared between identical requests, {skipped} duplicate facet queries skipped")
+        if self.credits and (self.credits.spent or self.credits.listings):
+            self.print_out(self.credits.report())
+        for pool in (self.endpoints, self.cookie_pool):
+            for line in pool.report() if pool else []:
+                self.print_out(line)
+        for host, (connections, requests_made) in sorted(self.transport_stats().items()):
+            reuse = 1 - connections / requests_made if requests_made else 0
+            self.print_out(f"connections: {host} - {connections} handshakes for {requests_made} requests ({reuse:.0%} reused)")
+
+    def send_fetch(self, fetch):
+        if self.coalescer is None or fetch.kwargs.get("stream"):
+            return self.request(fetch.method, fetch.url, **fetch.kwargs)
+        return self.coalescer.fetch(self.request_key(fetch), lambda: self.request(fetch.method, fetch.url, **fetch.kwargs))
+
+    async def async_send_fetch(self, fetch):
+        if self.coalescer is None or fetch.kwargs.get("stream"):
+            return await self.async_request(fetch.method, fetch.url, **fetch.kwargs)
+        return await self.coalescer.async_fetch(self.request_key(fetch), lambda: self.async_request(fetch.method, fetch.url, **fetch.kwargs))
+
+    def request_key(self, fetch):
+        body = fetch.kwargs.get("data")
+        if isinstance(body, (str, bytes)):
+            try:
+                body = json.dumps(json.loads(body), sort_keys=True)
+            except ValueError:
+                pass
+        headers = {key.lower(): value for key, value in (fetch.kwargs.get("headers") or {}).items()}
+        vary = []
+        for name in self.cache_vary:
+            value = headers.get(name, "")
+            vary.append(canonical_url(value) if value.startswith(("http://", "https://")) else value)
+        return json.dumps([fetch.method.upper(), canonical_url(fetch.url), body if isinstance(body, str) else repr(body), vary])
+
+    def fetch_in_order(self, fetch, items):
+        if self.fetch_pool is None:
+            for item in items:
+                yield item, fetch(item)
+            return
+
+        items = iter(items)
+        pending = deque()
+        try:
+            for item in islice(items, self.max_concurrency):
+                pending.append((item, self.fetch_pool.submit(fetch, item)))
+
+            while pending:
+                item, future = pending.popleft()
+                response = future.result()
+                for next_item in islice(items, 1):
+                    pending.append((next_item, self.fetch_pool.submit(fetch, next_item)))
+                yield item, response
+        finally:
+            for _, future in pending:
+                future.cancel()
\ No newline at end of file
@@ -1,19 +1,224 @@
 import logging
+from logging.handlers import QueueHandler, QueueListener
 import csv
-import requests
+import os
+import argparse
 from lxml import etree
 import json
-
-
-class BaseScraper:
+import copy
+import hashlib
+import zlib
+import time
+import threading
+import queue
+import asyncio
+import multiprocessing
+import inspect
+import contextvars
+import socket
+import shutil
+import tempfile
+from array import array
+from collections import deque, Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice, compress
+
+from checkpoint import DedupStore, Checkpoint, DiscoveryCache, Snapshot, WorkQueue
+from sinks import SINKS, BackgroundSink, ShardedSink
+from requester import Requester, EndpointPool, CreditScheduler, ResponseCache, Coalescer, Fetch, canonical_url
+from metrics import Metrics, profiling
+from wayfair_stream import NEXT_F_START, LAST_PAGE_LINK, PRODUCT_MARKERS, CATEGORY_MARKERS, iter_next_f_payloads, tee_last_page, extract_wayfair_products, extract_wayfair_categories, parse_wayfair_page
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+current_lease = contextvars.ContextVar("current_lease", default=None)
+current_claims = contextvars.ContextVar("current_claims", default=None)
+current_rows = contextvars.ContextVar("current_rows", default=None)
+
+
+def pluck(items, *path, default=None):
+    column = []
+    for item in items:
+        for key in path:
+            item = item.get(key) if isinstance(item, dict) else None
+            if item is None:
+                break
+        column.append(default if item is None else item)
+    return column
+
+
+def take(column, values):
+    return array(column.typecode, values) if isinstance(column, array) else list(values)
+
+
+class ProductBatch:
+    def __init__(self, keys, columns):
+        self.keys = list(keys)
+        self.columns = columns
+
+    @classmethod
+    def from_records(cls, keys, records, headers):
+        return cls(keys, {header: [record.get(header, '') for record in records] for header in headers})
+
+    @classmethod
+    def concat(cls, batches):
+        batches = list(batches)
+        columns = {}
+        for batch in batches:
+            for header, column in batch.columns.items():
+                columns.setdefault(header, take(column, ())).extend(column)
+        return cls([key for batch in batches for key in batch.keys], columns)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def select(self, mask):
+        mask = list(mask)
+        self.keys = list(compress(self.keys, mask))
+        self.columns = {header: take(column, compress(column, mask)) for header, column in self.columns.items()}
+        return self
+
+    def head(self, count):
+        self.keys = self.keys[:count]
+        self.columns = {header: column[:count] for header, column in self.columns.items()}
+        return self
+
+    def rows(self, headers):
+        empty = [''] * len(self)
+        return [list(row) for row in zip(*(self.columns.get(header, empty) for header in headers))]
+
+    def records(self, headers):
+        return [dict(zip(headers, row)) for row in self.rows(headers)]
+
+
+class BaseScraper(Requester):
     use_debug = True
     max_retry_cnt = 5
-
-    def __init__(self):
+    max_concurrency = 8
+    host_limits = {}
+    rate_limits = {}
+    default_rate = None
+    retry_statuses = (429, 500, 502, 503, 504)
+    backoff_base = 1.0
+    backoff_max = 60.0
+    request_timeout = 60.0
+    retry_budget = 0.2
+    min_retry_budget = 20
+    use_http2 = False
+    async_concurrency = 1000
+    compact_history = False
+    planner = "adaptive"
+    sink = "csv"
+    batch_size = 500
+    shard_dir = None
+    shard_max_bytes = 64 << 20
+    shard_max_seconds = 300
+    background_writer = False
+    cache_dir = None
+    cache_ttl = 86400
+    cache_max_bytes = 2 << 30
+    cache_vary = ()
+    stream_responses = False
+    stream_chunk_size = 64 * 1024
+    parse_workers = 0
+    parse_backlog = 0
+    coalesce = True
+    coalesce_entries = 64
+    offline = False
+    categories = None
+    log_queue = None
+    queue_dir = None
+    role = None
+    partition = None
+    poll_interval = 5
+    pages_per_task = 5
+    incremental = False
+    early_stop = False
+    api_endpoints = ()
+    cookie_sets = ()
+    endpoint_cooldown = 30.0
+    credit_budget = 0
+    credit_cost = 1
+    category_target = 0
+    default_category = {}
+    discovery_ttl = 7 * 86400
+    refresh_discovery = False
+    metrics_dir = None
+    metrics_interval = 60
+    profile = None
+
+    def __init__(self, resume=False):
+        self.resume = resume
+        self.history = DedupStore(self.compact_history)
+        self.checkpoint = None
+        self.lock = threading.Lock()
+        self.output_lock = threading.Lock()
+        self.counts = dict(self.counts)
+        self.counts_lock = threading.RLock()
+        self.written_keys = []
+        self.host_slots = {}
+        self.stream_slots = {}
+        self.async_slots = {}
+        self.buckets = {}
+        self.request_counts = {}
+        self.retries = 0
+        self.rows = 0
+        self.failed = False
+        self.started = time.monotonic()
+        self.cache = None
+        self.snapshot = None
+        self.discovery = None
+        self.stopped_pages = {}
+        self.metrics = Metrics()
+        self.metrics_stopped = threading.Event()
+        self.parse_pool = None
+        self.fetch_pool = ThreadPoolExecutor(max_workers=self.max_concurrency) if self.max_concurrency > 1 else None
+        self.coalescer = Coalescer(self.coalesce_entries) if self.coalesce else None
+        self.claimed_queries = set()
+        self.endpoints = EndpointPool(self.api_endpoints, self.endpoint_cooldown) if self.api_endpoints else None
+        self.cookie_pool = None
+        if self.cookie_sets:
+            labels = [f"cookies #{index}" for index in range(len(self.cookie_sets))]
+            self.cookie_pool = EndpointPool(self.cookie_sets, self.endpoint_cooldown, labels=labels)
+        self.credits = None
+        if self.credit_budget or self.category_target:
+            self.credits = CreditScheduler(self.credit_budget, self.credit_cost, self.category_target)
         try:
+            if self.cache_dir or self.offline:
+                self.cache = ResponseCache(
+                    self.cache_dir or "cache",
+                    ttl=self.cache_ttl,
+                    max_bytes=self.cache_max_bytes,
+                    offline=self.offline
+                )
             self.config_log()
-            self.writer = self.get_writer()
-            self.session = requests.Session()
+            if self.queue_dir:
+                self.partition = self.partition or f"{socket.gethostname()}-{os.getpid()}"
+                self.checkpoint = WorkQueue(os.path.join(self.queue_dir, f"{self.name}.queue.db"), self.partition)
+            else:
+                self.checkpoint = Checkpoint(f"{self.name}.checkpoint.db", resume)
+            for key in self.checkpoint.seen_keys():
+                self.history.add(key)
+            if self.incremental:
+                self.snapshot = Snapshot(f"{self.name}.snapshot.db", resume)
+            if self.default_category:
+                self.discovery = DiscoveryCache(f"{self.name}.discovery.db", self.discovery_ttl)
+            self.writer = self.get_writer() if self.role != "coordinator" else None
+            self.session = self.get_session()
+            if self.parse_workers:
+                self.parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers)
+                self.parse_slots = threading.BoundedSemaphore(self.parse_backlog or 2 * self.parse_workers)
+            if self.metrics_dir:
+                os.makedirs(self.metrics_dir, exist_ok=True)
+                threading.Thread(target=self.export_metrics_loop, daemon=True).start()
         except Exception as e:
             self.print_out(f"init: {e}")
 
@@ -46,6 +251,13 @@ class BaseScraper:
         return values
 
     def config_log(self):
+        if self.log_queue is not None:
+            root = logging.getLogger()
+            if not any(isinstance(handler, QueueHandler) for handler in root.handlers):
+                root.addHandler(QueueHandler(self.log_queue))
+                root.setLevel(logging.INFO)
+            return
+
         logging.basicConfig(
             filename=f"history.log",
             format='%(asctime)s %(levelname)-s %(message)s',
@@ -53,26 +265,533 @@ class BaseScraper:
             datefmt='%Y-%m-%d %H:%M:%S')
         
     def get_writer(self):
-        output_file = open(
-            f'{self.name}.csv',
-            mode='w',
-            newline='',
-            encoding="utf-8-sig"
-        )
-        output_writer = csv.writer(
-            output_file,
-            delimiter=',',
-            quotechar='"',
-            quoting=csv.QUOTE_ALL
-        )
-        output_writer.writerow(self.csv_headers)
+        sink = SINKS[self.sink]
+        name = f'{self.name}.delta' if self.snapshot else self.name
+        stem = f'{name}.{self.partition}' if self.partition else name
+        headers = self.csv_headers + ["Change"] if self.snapshot else self.csv_headers
+        position = self.checkpoint.position() if self.checkpoint else None
+        if self.shard_dir:
+            output_writer = ShardedSink(
+                sink,
+                os.path.join(self.shard_dir, name),
+                stem,
+                headers,
+                append=self.resume or bool(self.partition),
+                batch_size=self.batch_size,
+                max_bytes=self.shard_max_bytes,
+                max_seconds=self.shard_max_seconds,
+                position=position
+            )
+        else:
+            output_writer = sink(
+                f'{stem}.{sink.extension}',
+                headers,
+                append=self.resume or bool(self.partition),
+                batch_size=self.batch_size,
+                position=position
+            )
+        if self.background_writer:
+            output_writer = BackgroundSink(output_writer)
         return output_writer
     
-    def write(self, values):
+    def write(self, values, key=None):
+        key = values["URL"] if key is None else key
         row = []
         for header in self.csv_headers:
             row.append(values.get(header, ''))
-        self.writer.writerow(row)
+
+        with self.output_lock:
+            status = None
+            if self.snapshot:
+                status = self.snapshot.update(key, values)
+            self.written_keys.append(key)
+            if status == "unchanged":
+                return status
+            if status:
+                row.append(status)
+            with self.metrics.timer("write_seconds"):
+                self.writer.write(row)
+        self.metrics.inc("products", category=values.get("Category", ""))
+        with self.lock:
+            self.rows += 1
+        return status
+
+    def write_batch(self, batch):
+        statuses = [None] * len(batch)
+        rows = batch.rows(self.csv_headers)
+        with self.output_lock:
+            if self.snapshot:
+                statuses = [self.snapshot.update(key, dict(zip(self.csv_headers, row))) for key, row in zip(batch.keys, rows)]
+                rows = [row + [status] for row, status in zip(rows, statuses) if status != "unchanged"]
+            self.written_keys.extend(batch.keys)
+            if rows:
+                with self.metrics.timer("write_seconds"):
+                    self.writer.write_many(rows)
+        if not rows:
+            return statuses
+        if "Category" in self.csv_headers:
+            column = self.csv_headers.index("Category")
+            for category, count in Counter(row[column] for row in rows).items():
+                self.metrics.inc("products", count, category=category)
+        with self.lock:
+            self.rows += len(rows)
+        return statuses
+
+    def build_batch(self, name, items, build):
+        try:
+            return build(name, items)
+        except Exception:
+            pass
+        batches = []
+        for item in items:
+            try:
+                batches.append(build(name, [item]))
+            except Exception as e:
+                self.print_out(f"build_batch: {name} - skipped product - {e}")
+                self.metrics.inc("skipped_products", category=name)
+                self.incomplete(name)
+        return ProductBatch.concat(batches)
+
+    def validate_column(self, values):
+        return [value.strip() if type(value) is str else self.validate(value) for value in values]
+
+    def int_column(self, values):
+        column = []
+        for value in values:
+            try:
+                column.append(value if type(value) is int else int(self.validate(value)))
+            except ValueError:
+                column.append(None)
+        return column
+
+    def listed(self, key, values):
+        if self.snapshot:
+            return "unchanged" if self.snapshot.matches(key, values) else "changed"
+        return None
+
+    def add_count(self, category, rows=1):
+        with self.counts_lock:
+            count = self.counts[category] = self.counts.get(category, 0) + rows
+        written = current_rows.get()
+        if written is not None:
+            written[category] = written.get(category, 0) + rows
+        return count
+
+    def set_count(self, category, count):
+        with self.counts_lock:
+            self.counts[category] = count
+
+    def page_unchanged(self, statuses):
+        statuses = [status for status in statuses if status]
+        return self.early_stop and bool(statuses) and all(status == "unchanged" for status in statuses)
+
+    def stop_listing(self, category, listing, page_index):
+        with self.lock:
+            self.stopped_pages[listing] = min(page_index, self.stopped_pages.get(listing, page_index))
+        self.incomplete(category)
+
+    def incomplete(self, category=None):
+        if self.snapshot:
+            self.snapshot.truncate(category)
+
+    def listing_stopped(self, listing, page_index):
+        return page_index > self.stopped_pages.get(listing, page_index)
+
+    def wants(self, category):
+        return not self.categories or category in self.categories
+
+    def progress(self):
+        return {
+            "rows": self.rows,
+            "requests": sum(self.request_counts.values()),
+            "retries": self.retries,
+            "failed": self.failed,
+            "seconds": time.monotonic() - self.started,
+        }
+
+    def seen(self, key):
+        if key in self.history:
+            self.metrics.inc("dedup_hits")
+            return True
+        return False
+
+    def remember(self, key):
+        return self.remember_many([key])[0]
+
+    def remember_many(self, keys):
+        if self.queue_dir:
+            added = self.checkpoint.add_seen_many(keys, current_lease.get())
+        else:
+            added = self.history.add_many(keys)
+        if added.count(False):
+            self.metrics.inc("dedup_hits", added.count(False))
+        return added
+
+    def is_done(self, *unit):
+        return self.checkpoint is not None and self.checkpoint.is_done(*unit)
+
+    def mark_done(self, *unit):
+        self.commit_unit(*unit)
+
+    def commit_unit(self, *unit):
+        with self.output_lock:
+            with self.metrics.timer("flush_seconds"):
+                self.writer.flush()
+            keys, self.written_keys = self.written_keys, []
+            position = self.writer.tell()
+            if self.snapshot:
+                self.snapshot.commit()
+            if self.checkpoint:
+                self.checkpoint.mark_done(*unit, keys=keys, position=position)
+            self.writer.rotate()
+
+    def export_metrics_loop(self):
+        while not self.metrics_stopped.wait(self.metrics_interval):
+            self.export_metrics()
+
+    def export_metrics(self):
+        try:
+            summary = dict(self.metrics.summary(), progress=self.progress())
+            outputs = {
+                f"{self.name}.metrics.json": json.dumps(summary, indent=1),
+                f"{self.name}.prom": self.metrics.prometheus("scraper", retailer=self.name),
+            }
+            for file_name, text in outputs.items():
+                path = os.path.join(self.metrics_dir, file_name)
+                with open(f"{path}.tmp", "w", encoding="utf-8") as metrics_file:
+                    metrics_file.write(text)
+                os.replace(f"{path}.tmp", path)
+        except Exception as e:
+            self.print_out(f"export_metrics: {e}")
+
+    def close(self):
+        self.metrics_stopped.set()
+        if self.metrics_dir:
+            self.export_metrics()
+        try:
+            if self.parse_pool:
+                self.parse_pool.shutdown(cancel_futures=True)
+            if self.fetch_pool:
+                self.fetch_pool.shutdown(cancel_futures=True)
+            if self.writer:
+                self.writer.close()
+            if self.checkpoint:
+                self.checkpoint.close()
+            if self.snapshot:
+                self.snapshot.close()
+            if self.discovery:
+                self.discovery.close()
+        except Exception as e:
+            self.print_out(f"close: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def page_range_tasks(self, last_page, *args):
+        tasks = []
+        for first in range(2, max(last_page, 2) + 1, self.pages_per_task):
+            last = first + self.pages_per_task - 1 if first + self.pages_per_task <= last_page else self.max_pages
+            tasks.append((None, self.parse_page_range, *args, first, last))
+        return tasks
+
+    def split_level(self, count, level):
+        if self.planner == "adaptive" and count < self.page_size:
+            return "Facet"
+        return level
+
+    def run(self):
+        try:
+            self.print_out("\nStarting...")
+            with profiling(self.profile, self.name, self.print_out):
+                if self.role == "coordinator":
+                    self.seed()
+                elif self.role == "worker":
+                    self.run_worker()
+                else:
+                    self.run_tasks(self.drive(self.discover()))
+            self.finish()
+        except Exception as e:
+            self.failed = True
+            self.print_out(f"run: {e}")
+
+    async def async_run(self):
+        try:
+            if aiohttp is None:
+                raise RuntimeError("the async runtime needs aiohttp installed")
+            if self.role:
+                raise RuntimeError("distributed mode runs on the threaded runtime")
+
+            self.print_out("\nStarting...")
+            connector = aiohttp.TCPConnector(limit=self.async_concurrency)
+            async with aiohttp.ClientSession(connector=connector) as self.async_session:
+                self.async_slots = {}
+                with profiling(self.profile, self.name, self.print_out):
+                    await self.async_run_tasks(await self.async_drive(self.discover()))
+            self.finish()
+        except Exception as e:
+            self.failed = True
+            self.print_out(f"run: {e}")
+
+    def finish(self):
+        removed = []
+        if self.snapshot:
+            removed = self.snapshot.disappeared()
+            for _, url, category, price, reviews, rating in removed:
+                self.writer.write([
+                    {"URL": url, "Category": category, "Price": price, "Reviews": reviews, "Rating": rating}.get(header, '')
+                    for header in self.csv_headers
+                ] + ["removed"])
+        if self.writer:
+            self.commit_unit("finish")
+        if self.snapshot:
+            self.print_out(f"delta: {self.rows} new or changed, {len(removed)} removed")
+        self.report_requests()
+        if self.queue_dir:
+            self.print_out(f"queue: {self.checkpoint.states()}")
+
+    def discover_categories(self):
+        tasks = []
+        missing = []
+        for entry, name in self.default_category.items():
+            if not self.wants(name):
+                continue
+            resolved = None if self.refresh_discovery else self.discovery.get(entry)
+            if resolved is None:
+                missing.append(entry)
+            else:
+                tasks.append(self.resolved_task(entry, self.resolved_target(resolved)))
+        self.print_out(f"discover: {len(tasks)} cached, {len(missing)} to resolve")
+        if missing:
+            tasks += yield from self.discover_nav(missing)
+        return tasks
+
+    def nav_links(self, nodes, label, href, entries):
+        links = {}
+        for node in nodes:
+            name = self.validate(node.xpath(label))
+            if name in entries and name not in links:
+                links[name] = self.validate(node.xpath(href))
+        return links
+
+    def resolved_task(self, entry, target):
+        name = self.default_category[entry]
+        return (self.category_task(name, target, "Color")[0], self.parse_resolved, entry, name, target)
+
+    def parse_resolved(self, entry, name, target):
+        if self.is_done(*self.category_task(name, target, "Color")[0]):
+            return []
+        try:
+            response = (yield self.api_fetch(name, target)).json()
+        except Exception as e:
+            self.print_out(f"parse_resolved: {name} - {e}")
+            return None
+        if not self.result_count(response):
+            self.print_out(f"discover: {entry} is stale, resolving it again")
+            self.discovery.invalidate(entry)
+            return [(None, self.rediscover, entry)]
+        return (yield from self.parse_category(name, target, "Color", response))
+
+    def rediscover(self, entry):
+        return self.discover_nav([entry])
+
+    def dump_task(self, task):
+        return json.dumps([task[1].__name__, list(task[2:])])
+
+    def load_task(self, task):
+        step, args = json.loads(task)
+        return getattr(self, step)(*args)
+
+    def seed(self):
+        if not self.resume:
+            self.checkpoint.reset()
+        self.checkpoint.publish([self.dump_task(task) for task in self.drive(self.discover())])
+
+    def run_worker(self):
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        running = {}
+        try:
+            while True:
+                while len(running) < self.max_concurrency:
+                    claimed = self.checkpoint.claim()
+                    if claimed is None:
+                        break
+                    claims = []
+                    running[executor.submit(self.run_leased, *claimed, claims)] = (claimed[0], claims)
+
+                if not running:
+                    if not self.checkpoint.remaining():
+                        return
+                    time.sleep(self.poll_interval)
+                    continue
+
+                done, _ = wait(list(running), timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task, claims = running.pop(future)
+                    try:
+                        children = future.result()
+                    except Exception as e:
+                        self.print_out(f"run_worker: {e}")
+                        children = None
+                    if children is None:
+                        self.release_queries(claims)
+                        self.checkpoint.release(task)
+                        continue
+                    self.checkpoint.publish([self.dump_task(child) for child in children])
+                    self.mark_done("task", task)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def run_leased(self, task, lease, claims):
+        current_lease.set(lease)
+        current_claims.set(claims)
+        return self.drive(self.load_task(task))
+
+    def drive(self, step):
+        if not inspect.isgenerator(step):
+            return step
+
+        response = None
+        error = None
+        while True:
+            try:
+                with self.metrics.timer("parse_seconds", step=step.__name__):
+                    fetch = step.throw(error) if error else step.send(response)
+            except StopIteration as stop:
+                return stop.value
+
+            error = None
+            try:
+                if isinstance(fetch, list):
+                    response = [response for _, response in self.fetch_in_order(self.send_fetch, fetch)]
+                else:
+                    response = self.send_fetch(fetch)
+            except Exception as e:
+                error = e
+
+    async def async_drive(self, step):
+        if not inspect.isgenerator(step):
+            return step
+
+        response = None
+        error = None
+        while True:
+            try:
+                with self.metrics.timer("parse_seconds", step=step.__name__):
+                    fetch = step.throw(error) if error else step.send(response)
+            except StopIteration as stop:
+                return stop.value
+
+            error = None
+            try:
+                if isinstance(fetch, list):
+                    response = await asyncio.gather(*(self.async_send_fetch(item) for item in fetch))
+                else:
+                    response = await self.async_send_fetch(fetch)
+            except Exception as e:
+                error = e
+
+    def claim_query(self, key):
+        if not self.coalesce:
+            return True
+        with self.lock:
+            if key in self.claimed_queries:
+                self.metrics.inc("coalesced_queries")
+                return False
+            self.claimed_queries.add(key)
+        claims = current_claims.get()
+        if claims is not None:
+            claims.append(key)
+        return True
+
+    def release_queries(self, keys):
+        with self.lock:
+            self.claimed_queries.difference_update(keys)
+
+    def task_node(self, task, parent):
+        return {"unit": task[0], "parent": parent, "open": 1, "ok": True, "claims": []}
+
+    def node_category(self, node):
+        while node and not node["unit"]:
+            node = node["parent"]
+        return node["unit"][0] if node else None
+
+    def finish_task(self, node, ok):
+        if not ok:
+            self.incomplete(self.node_category(node))
+        while node:
+            node["ok"] = node["ok"] and ok
+            node["open"] -= 1
+            if node["open"]:
+                return
+            if node["ok"] and node["unit"]:
+                self.mark_done(*node["unit"])
+            elif not node["ok"]:
+                self.release_queries(node["claims"])
+            ok = node["ok"]
+            node = node["parent"]
+
+    def run_step(self, task, node):
+        current_claims.set(node["claims"])
+        return self.drive(task[1](*task[2:]))
+
+    async def async_run_step(self, task, node):
+        current_claims.set(node["claims"])
+        return await self.async_drive(task[1](*task[2:]))
+
+    def run_tasks(self, tasks):
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        pending = {}
+
+        def submit(task, parent):
+            node = self.task_node(task, parent)
+            pending[executor.submit(self.run_step, task, node)] = node
+
+        try:
+            for task in tasks:
+                submit(task, None)
+
+            while pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = pending.pop(future)
+                    try:
+                        children = future.result()
+                    except Exception as e:
+                        self.print_out(f"run_tasks: {e}")
+                        children = None
+                    for child in children or []:
+                        node["open"] += 1
+                        submit(child, node)
+                    self.finish_task(node, children is not None)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    async def async_run_tasks(self, tasks):
+        pending = {}
+
+        def submit(task, parent):
+            node = self.task_node(task, parent)
+            pending[asyncio.ensure_future(self.async_run_step(task, node))] = node
+
+        for task in tasks:
+            submit(task, None)
+
+        while pending:
+            done, _ = await asyncio.wait(list(pending), return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                node = pending.pop(future)
+                try:
+                    children = future.result()
+                except Exception as e:
+                    self.print_out(f"run_tasks: {e}")
+                    children = None
+                for child in children or []:
+                    node["open"] += 1
+                    submit(child, node)
+                self.finish_task(node, children is not None)
 
     def print_out(self, value):
         if self.use_debug:
@@ -103,73 +822,277 @@ class WayfairScraper(BaseScraper):
     ]
     counts = {}
     limit = 10000
-    history = []
     name = "wayfair"
+    use_extractor = False
+    early_stop = True
 
-    def run(self):
-        try:
-            self.print_out("\nStarting...")
-            for base_url in self.base_urls:
-                self.parse_category(base_url[1], base_url[0])
-        except Exception as e:
-            self.print_out(f"run: {e}")
+    def discover(self):
+        return [(None, self.parse_category, base_url[1], base_url[0]) for base_url in self.base_urls if self.wants(base_url[0])]
 
-    def parse_category(self, url, base_category=None, level=0, retry_cnt=0):
+    def parse_category(self, url, base_category=None, level=0):
+        tasks = []
         try:
-            response = self.session.get(f"{self.scraper_api}{url}", headers=self.site_headers)
-            script_data = response.text.replace("\\", "")
-            category_data = script_data.split('self.__next_f.push([1,"{"StoreFrontFeatureToggle')[1].split('"])')[0]
-            categories = category_data.split("ProductCategory:")[1:]
-            products = script_data.split("RecommendedListingCollectionItem")
-
-            if len(products) > 10 and base_category:
-                if self.counts[base_category] < self.limit and level != 0:
-                    self.parse_products(url, base_category)
+            response = yield Fetch("GET", f"{self.scraper_api}{url}", category=base_category, headers=self.site_headers)
+            categories = []
+            product_count = 0
+            if self.use_extractor:
+                payloads = list(iter_next_f_payloads(response.text, PRODUCT_MARKERS + CATEGORY_MARKERS))
+                categories = list(extract_wayfair_categories(payloads))
+                product_count = sum(1 for _ in extract_wayfair_products(payloads))
+
+            if not categories and not product_count:
+                script_data = response.text.replace("\\", "")
+                category_data = script_data.split('self.__next_f.push([1,"{"StoreFrontFeatureToggle')[1].split('"])')[0]
+                for category in category_data.split("ProductCategory:")[1:]:
+                    try:
+                        categories.append((
+                            category.split('"displayName":"')[1].split('"')[0].replace("u0026", "&"),
+                            category.split('"url":"')[1].split('"')[0]
+                        ))
+                    except:
+                        pass
+                product_count = len(script_data.split("RecommendedListingCollectionItem")) - 1
+
+            if product_count >= 10 and base_category:
+                if self.counts[base_category] >= self.limit:
+                    self.incomplete(base_category)
+                elif level != 0:
+                    tasks += yield from self.parse_products(url, base_category)
             else:
                 if level > 2:
-                    return
+                    self.incomplete(base_category)
+                    return []
 
-                for category in categories:
+                listings = []
+                for category_name, category_url in categories:
                     try:
-                        category_name = category.split('"displayName":"')[1].split('"')[0].replace("u0026", "&")
-                        category_url = category.split('"url":"')[1].split('"')[0]
-                        
-                        self.counts[base_category] = 0
+                        self.set_count(base_category, 0)
 
                         self.print_out(f"Category: {category_name}, Url: {category_url}")
                         # self.parse_category(category_url, parent_category, level+1)
-                        self.parse_products(category_url, base_category)
+                        listing = yield from self.probe_listing(category_url, base_category)
+                        if listing and self.role:
+                            tasks += self.listing_tasks(*listing)
+                        elif listing and self.credits:
+                            listings.append(listing)
+                        elif listing:
+                            yield from self.crawl_listing(*listing)
                     except:
-                        pass
+                        self.incomplete(base_category)
+
+                for listing in sorted(listings, key=lambda listing: self.credits.priority(listing[0]), reverse=True):
+                    try:
+                        yield from self.crawl_listing(*listing)
+                    except:
+                        self.incomplete(base_category)
         except Exception as e:
-            print(e)
-            if retry_cnt < self.max_retry_cnt:
-                self.print_out(f"Retry...{retry_cnt}")
-                retry_cnt += 1
-                self.parse_category(url, base_category, level, retry_cnt)
+            self.print_out(f"parse_category: {url} - {e}")
+            self.incomplete(base_category)
+        return tasks
+
+    def blocked(self, response):
+        return NEXT_F_START not in response.text
+
+    def get_page(self, url, page_index, category=None, stream=False):
+        return Fetch(
+            "GET",
+            f"{self.scraper_api}{url}?itemsperpage=96&sortby=7&curpage={page_index}",
+            category=category,
+            headers=self.site_headers,
+            stream=stream
+        )
 
-    def parse_products(self, url, base_category):
-        response = self.session.get(f"{self.scraper_api}{url}?itemsperpage=96&sortby=7&curpage=0", headers=self.site_headers)
-        tree = etree.HTML(response.text)
-        self.parse_response(url, base_category, response)
+    def streaming(self):
+        return self.stream_responses and self.cache is None
+
+    def offloading(self):
+        return self.parse_pool is not None and not self.streaming()
+
+    def offload(self, response):
+        self.parse_slots.acquire()
+        try:
+            future = self.parse_pool.submit(parse_wayfair_page, response.content, response.encoding)
+        except Exception:
+            self.parse_slots.release()
+            raise
+        future.add_done_callback(lambda _: self.parse_slots.release())
+        return future
+
+    def parse_page(self, url, base_category, page_index, response=None, parsed=None):
+        if response is None:
+            response = yield self.get_page(url, page_index, base_category, stream=self.streaming())
+        if self.streaming():
+            statuses, last_page = self.parse_streamed(url, base_category, response, page_index)
+            if statuses is not None:
+                return statuses, last_page
+            response = yield self.get_page(url, page_index, base_category)
+
+        if parsed is None and self.offloading():
+            parsed = self.offload(response)
+        if parsed is not None:
+            try:
+                with self.metrics.timer("parse_wait_seconds"):
+                    records, last_page = parsed.result()
+                return self.parse_response(url, base_category, response, page_index, records), last_page
+            except Exception as e:
+                self.print_out(f"parse_page: {url} - {page_index} - parser process failed, parsing here - {e}")
+
+        match = LAST_PAGE_LINK.search(response.text)
+        return self.parse_response(url, base_category, response, page_index), match.group(1) if match else ""
+
+    def parse_streamed(self, url, base_category, response, page_index):
+        last_page = []
+        try:
+            statuses = self.extract_products(base_category, tee_last_page(self.iter_text(response), last_page))
+        finally:
+            self.close_response(response)
+        if not statuses:
+            return None, ""
+        self.print_out(f"{base_category} : {page_index} : {len(statuses)} : {url}")
+        return statuses, last_page[0] if last_page else ""
 
-        last_page = int(self.validate(tree.xpath(".//*[contains(@data-enzyme-id, 'paginationLastPageLink')]/text()"))) + 1
+    def parse_products(self, url, base_category):
+        listing = yield from self.probe_listing(url, base_category)
+        if listing and self.role:
+            return self.listing_tasks(*listing)
+        if listing:
+            yield from self.crawl_listing(*listing)
+        return []
+
+    def listing_tasks(self, url, base_category, page_indexes, count):
+        return [
+            (None, self.parse_page_range, url, base_category, page_indexes[start:start + self.pages_per_task])
+            for start in range(0, len(page_indexes), self.pages_per_task)
+        ]
+
+    def parse_page_range(self, url, base_category, page_indexes):
+        page_indexes = [
+            page_index for page_index in page_indexes
+            if not self.is_done(base_category, url, page_index) and not self.listing_stopped(url, page_index)
+        ]
+        if self.credits and url not in self.credits.listings:
+            self.credits.plan(url, base_category, len(page_indexes), 0)
+        yield from self.crawl_listing(url, base_category, page_indexes, self.counts.get(base_category, 0))
+        return []
+
+    def probe_listing(self, url, base_category):
+        if self.credits and (self.credits.reached(base_category) or not self.credits.affordable()):
+            self.print_out(f"credits: skipped {base_category} - {url}")
+            self.incomplete(base_category)
+            return None
+        written = {}
+        current_rows.set(written)
+        statuses, last_page = yield from self.parse_page(url, base_category, 0)
+        last_page = int(self.validate(last_page)) + 1
         self.print_out(f"last page: {last_page}")
 
+        if self.counts[base_category] > self.limit or self.page_unchanged(statuses):
+            self.stop_listing(base_category, url, 1)
+            return None
         if last_page < 1:
-            return
+            return None
 
-        for page_index in range(2, last_page):
-            if self.counts[base_category] > self.limit:
-                return
+        page_indexes = [page_index for page_index in range(2, last_page) if not self.is_done(base_category, url, page_index)]
+        if self.credits:
+            self.credits.plan(url, base_category, len(page_indexes), written.get(base_category, 0))
+        return url, base_category, page_indexes, self.counts[base_category]
 
-            response = self.session.get(f"{self.scraper_api}{url}?itemsperpage=96&sortby=7&curpage={page_index}", headers=self.site_headers)
-            self.parse_response(url, base_category, response, page_index)
+    def crawl_listing(self, url, base_category, page_indexes, count):
+        self.set_count(base_category, count)
+        try:
+            yield from self.crawl_pages(url, base_category, page_indexes)
+        finally:
+            if self.credits:
+                self.credits.finish(url)
+
+    def crawl_pages(self, url, base_category, page_indexes):
+        start = 0
+        while start < len(page_indexes):
+            size = self.max_concurrency
+            if self.credits:
+                if self.credits.reached(base_category):
+                    self.print_out(f"credits: {base_category} reached its target, stopping {url}")
+                    self.incomplete(base_category)
+                    return
+                size = self.credits.grant(url, size)
+                if not size:
+                    self.print_out(f"credits: dropped {base_category} - {url} after {start} of {len(page_indexes)} pages")
+                    self.incomplete(base_category)
+                    return
+            window = page_indexes[start:start + size]
+            start += len(window)
+            responses = yield [self.get_page(url, page_index, base_category, stream=self.streaming()) for page_index in window]
+            parsed = [self.offload(response) if self.offloading() else None for response in responses]
+            try:
+                for page_index, response, future in zip(window, responses, parsed):
+                    written = {}
+                    current_rows.set(written)
+                    statuses, _ = yield from self.parse_page(url, base_category, page_index, response, future)
+                    self.mark_done(base_category, url, page_index)
+                    if self.credits:
+                        self.credits.observe(url, written.get(base_category, 0))
+                    if self.counts[base_category] > self.limit or self.page_unchanged(statuses):
+                        self.stop_listing(base_category, url, page_index)
+                        return
+            finally:
+                for response, future in zip(responses, parsed):
+                    self.close_response(response)
+                    if future is not None:
+                        future.cancel()
+
+    def parse_response(self, url, base_category, response, page_index=1, records=None):
+        if self.use_extractor or records is not None:
+            if records is None:
+                records = extract_wayfair_products(iter_next_f_payloads(response.text, PRODUCT_MARKERS))
+            statuses = self.write_records(base_category, records)
+            if statuses:
+                self.print_out(f"{base_category} : {page_index} : {len(statuses)} : {url}")
+                return statuses
+
+        return self.parse_response_split(url, base_category, response, page_index)
+
+    def extract_products(self, base_category, pieces):
+        return self.write_records(base_category, extract_wayfair_products(iter_next_f_payloads(pieces, PRODUCT_MARKERS)))
+
+    def product_columns(self, base_category, records):
+        descriptions = self.validate_column(pluck(records, "description"))
+        reviews = self.int_column(pluck(records, "reviews", default=0))
+        urls = self.validate_column(pluck(records, "url"))
+        keep = [
+            count is not None and count >= 100 and description not in ("Our App", "", base_category)
+            and (record["format"] != "listing" or count <= 30000) and "/pdp/" in url
+            for record, description, count, url in zip(records, descriptions, reviews, urls)
+        ]
+        records = list(compress(records, keep))
+        return ProductBatch(compress(urls, keep), {
+            "Description": list(compress(descriptions, keep)),
+            "URL": list(compress(urls, keep)),
+            "Price": self.validate_column(record["price"] for record in records),
+            "Reviews": array("q", compress(reviews, keep)),
+            "Rating": self.validate_column(record["rating"] for record in records),
+            "Category": [base_category] * len(records),
+        })
+
+    def write_records(self, base_category, records):
+        records = list(records)
+        try:
+            batch = self.build_batch(base_category, records, self.product_columns)
+            with self.counts_lock:
+                batch.head(max(0, self.limit + 1 - self.counts[base_category]))
+                batch.select(self.remember_many(batch.keys))
+                self.add_count(base_category, len(batch))
+            statuses = self.write_batch(batch)
+            return statuses + [None] * (len(records) - len(batch))
+        except Exception as e:
+            self.print_out(f"extract_products: {base_category} - {e}")
+            self.incomplete(base_category)
+            return [None] * len(records)
 
-    def parse_response(self, url, base_category, response, page_index=1):
+    def parse_response_split(self, url, base_category, response, page_index=1):
         script_data = response.text.replace("\\", "")
         products = script_data.split("RecommendedListingCollectionItem")
         self.print_out(f"{base_category} : {page_index} : {len(products)} : {url}")
+        statuses = []
 
         if len(products) > 10 and len(products) < 200:
             for product in products[1:-1]:
@@ -181,7 +1104,7 @@ class WayfairScraper(BaseScraper):
                         continue
                     
                     product_url = product.split('"listingUrl":"')[1].split('"')[0]
-                    if product_url in self.history or "/pdp/" not in product_url:
+                    if self.seen(product_url) or "/pdp/" not in product_url:
                         continue
 
                     product_data = {
@@ -192,11 +1115,10 @@ class WayfairScraper(BaseScraper):
                         "Rating": product.split('"averageRating":')[1].split(',')[0],
                         "Category": base_category,
                     }
-                    self.write(product_data)
-                    self.history.append(product_url)
-                    self.counts[base_category] += 1
-                    if self.counts[base_category] > self.limit:
-                        return
+                    statuses.append(self.write(product_data))
+                    self.remember(product_url)
+                    if self.add_count(base_category) > self.limit:
+                        return statuses
                 except:
                     pass
         else:
@@ -206,7 +1128,7 @@ class WayfairScraper(BaseScraper):
             self.print_out(f"___ {base_category} : {page_index} : {len(products)} : {url}")
 
             if len(products) < 10:
-                return
+                return statuses
 
             for product in products[1:]:
                 try:
@@ -217,7 +1139,7 @@ class WayfairScraper(BaseScraper):
                         continue
                     
                     product_url = product.split('"')[0]
-                    if product_url in self.history or "/pdp/" not in product_url:
+                    if self.seen(product_url) or "/pdp/" not in product_url:
                         continue
 
                     product_data = {
@@ -228,13 +1150,128 @@ class WayfairScraper(BaseScraper):
                         "Rating": product.split('"average_overall_rating":"')[1].split('"')[0],
                         "Category": base_category,
                     }
-                    self.write(product_data)
-                    self.history.append(product_url)
-                    self.counts[base_category] += 1
-                    if self.counts[base_category] > self.limit:
-                        return
+                    statuses.append(self.write(product_data))
+                    self.remember(product_url)
+                    if self.add_count(base_category) > self.limit:
+                        return statuses
                 except:
                     pass
+        return statuses
+
+
+class ReviewEnricher:
+    review_url = "https://display.powerreviews.com/m/1280018588/l/en_US/product/{}/snippet?apikey=0ce15d13-67ca-47dd-8c72-1d5e4694ada3&_noconfig=true"
+    review_headers = {
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
+        "Accept-encoding": "gzip, deflate, br, zstd",
+        "Upgrade-insecure-requests": "1",
+        "User-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36"
+    }
+
+    def __init__(self, scraper, batch_size=60, max_concurrency=4):
+        self.scraper = scraper
+        self.batch_size = batch_size
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self.lock = threading.Lock()
+        self.pending = deque()
+        self.batches = deque()
+        self.units = deque()
+        self.failed = {}
+        self.futures = []
+        self.queued = 0
+        self.written = 0
+        self.calls = 0
+        self.products = 0
+
+    def add(self, product_id, data):
+        self.add_many([(product_id, data)])
+
+    def add_many(self, items):
+        with self.lock:
+            self.pending.extend(items)
+            self.queued += len(items)
+            self.products += len(items)
+            while len(self.pending) >= self.batch_size:
+                self.submit()
+
+    def defer(self, unit):
+        with self.lock:
+            self.units.append((self.queued, unit))
+        self.commit_units()
+
+    def submit(self):
+        batch = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+        if not batch:
+            return
+        marker = {"start": self.queued - len(self.pending) - len(batch), "end": self.queued - len(self.pending), "done": False}
+        self.batches.append(marker)
+        self.futures.append(self.executor.submit(self.enrich, batch, marker))
+
+    def enrich(self, batch, marker):
+        try:
+            product_data = dict(batch)
+            with self.lock:
+                self.calls += 1
+            response = self.scraper.request(
+                "GET",
+                self.review_url.format("%2C".join(product_data)),
+                category="reviews",
+                headers=self.review_headers
+            )
+            for review in response.json().get("results"):
+                product_id = self.scraper.validate(review.get("page_id"))
+                if product_id not in product_data:
+                    continue
+                product_data[product_id]["Reviews"] = self.scraper.validate(review.get("rollup", {}).get("review_count"))
+                product_data[product_id]["Rating"] = self.scraper.validate(review.get("rollup", {}).get("average_rating"))
+
+            self.scraper.write_batch(ProductBatch.from_records(
+                list(product_data),
+                list(product_data.values()),
+                self.scraper.csv_headers
+            ))
+        except Exception as e:
+            self.scraper.print_out(f"enrich: {e}")
+            with self.lock:
+                for _, data in batch:
+                    self.failed.setdefault(data["Category"], marker["start"])
+            for category in set(data["Category"] for _, data in batch):
+                self.scraper.incomplete(category)
+        finally:
+            with self.lock:
+                marker["done"] = True
+                while self.batches and self.batches[0]["done"]:
+                    self.written = self.batches.popleft()["end"]
+            self.commit_units()
+
+    def commit_units(self):
+        while True:
+            with self.lock:
+                if not self.units or self.units[0][0] > self.written:
+                    return
+                queued, unit = self.units.popleft()
+                starts = self.failed.values() if unit[0] == "task" else [self.failed.get(unit[0], queued)]
+                held = any(queued > start for start in starts)
+            if not held:
+                self.scraper.commit_unit(*unit)
+            elif unit[0] == "task":
+                self.scraper.checkpoint.release(unit[1])
+
+    def flush(self):
+        with self.lock:
+            while self.pending:
+                self.submit()
+            futures, self.futures = self.futures, []
+        wait(futures)
+        self.commit_units()
+
+    def report(self):
+        if self.products:
+            self.scraper.print_out(f"reviews: {self.calls} calls for {self.products} products ({self.calls * 1000 / self.products:.1f} per 1000)")
+
+    def close(self):
+        self.flush()
+        self.executor.shutdown()
 
 
 class OverstockScraper(BaseScraper):
@@ -256,8 +1293,12 @@ class OverstockScraper(BaseScraper):
     ]
     counts = {}
     limit = 10000
-    history = []
     name = "overstock1"
+    page_size = 60
+    max_pages = 20
+    early_stop = True
+    review_batch_size = 60
+    review_concurrency = 4
     default_category = {
         "Sofas": "Sofas",
         "Sectional Sofas": "Sectionals",
@@ -286,215 +1327,265 @@ class OverstockScraper(BaseScraper):
         "Outdoor Lighting": "Outdoor Lighting",
     }
 
-    def run(self):
-        try:
-            self.print_out("\nStarting...")
-            response = self.session.get(f"{self.base_url}")
-            tree = etree.HTML(response.text)
-            sections = tree.xpath("//nav-menu[contains(@class, 'js-mega-nav')]")
-            for section_index in [0, 1]:
-                categories = sections[section_index].xpath(".//li")
-                for category in categories[:-1]:
-                    category_name = self.validate(category.xpath(".//text()"))
-                    category_url = self.validate(category.xpath(".//a/@href"))
-                    if category_name in self.default_category:
-                        category_name = self.default_category[category_name]
-                        self.parse_page(category_name, category_url)
-
-            for section_index in range(19, 25):
-                category = sections[section_index]
-                category_name = self.validate(category.xpath(".//div[@class='main-nav__item-content']//text()"))
-                category_url = self.validate(category.xpath(".//div[@class='main-nav__item-content']//a/@href"))
-                if category_name in self.default_category:
-                    category_name = self.default_category[category_name]
-                    self.parse_page(category_name, category_url)
+    def __init__(self, resume=False):
+        self.reviews = ReviewEnricher(self, self.review_batch_size, self.review_concurrency)
+        super().__init__(resume)
 
-        except Exception as e:
-            self.print_out(f"run: {e}")
+    def mark_done(self, *unit):
+        self.reviews.defer(unit)
+
+    def close(self):
+        self.reviews.close()
+        super().close()
+
+    def discover(self):
+        return self.discover_categories()
+
+    def discover_nav(self, entries):
+        response = yield Fetch("GET", f"{self.base_url}")
+        tree = etree.HTML(response.text)
+        menu = "//nav-menu[contains(@class, 'js-mega-nav')]"
+        links = self.nav_links(
+            tree.xpath(f"{menu}//div[@class='main-nav__item-content'] | {menu}//li"),
+            ".//text()",
+            ".//a/@href",
+            entries
+        )
+        for entry in set(entries) - set(links):
+            self.incomplete(self.default_category[entry])
+        return [(None, self.parse_page, self.default_category[entry], url, entry) for entry, url in links.items()]
+
+    def resolved_target(self, resolved):
+        return self.search_payload(resolved["taxonomy"])
+
+    def result_count(self, response):
+        return response.get("resultCount", 0)
 
-    def parse_page(self, name, url):
+    def finish(self):
+        self.reviews.flush()
+        self.reviews.report()
+        super().finish()
+
+    def parse_page(self, name, url, entry=None):
         try:
-            response = self.session.get(f"{self.base_url}{url}")
+            response = yield Fetch("GET", f"{self.base_url}{url}", category=name)
             taxonomy_id = response.text.split("'taxonomyId':")[1].split(",")[0].replace('"', '').strip()
             self.print_out(f"parse_page: {name} - {taxonomy_id}")
             if taxonomy_id == "":
-                return
+                self.incomplete(name)
+                return []
 
-            payload = {
-                "client":{
-                    "id":"ostk",
-                    "version":"1.0.0",
-                    "deviceType":"DESKTOP"
-                },
-                "user":{
-                    "seed":"3622946904276041631",
-                    "language":"en",
-                    "country":"US",
-                    "currency":"USD",
-                    "zip":"",
-                    "zipByIp":"",
-                    "requestId":""
-                },
-                "query":{
-                    "productSearchQuery":{
-                        "taxonomies":[taxonomy_id],
-                        "attributes":{},
-                        "restrictions":{},
-                        "ranges":{},
-                        "searchParameters":{
-                            "fastshipping":None,
-                            "oos":None,
-                            "page":1,
-                            "sort":"bestselling",
-                            "rating":None
-                        }
-                    },
-                    "origin":{
-                        "scheme":"https",
-                        "hostType":"DomainName",
-                        "host":"www.overstock.com"
+            if entry:
+                self.discovery.put(entry, {"url": url, "taxonomy": taxonomy_id})
+            return [self.category_task(name, self.search_payload(taxonomy_id), "Color")]
+        except Exception as e:
+            self.print_out(f"parse_page: {name} - {e}")
+            self.incomplete(name)
+            return None
+
+    def search_payload(self, taxonomy_id):
+        return {
+            "client":{
+                "id":"ostk",
+                "version":"1.0.0",
+                "deviceType":"DESKTOP"
+            },
+            "user":{
+                "seed":"3622946904276041631",
+                "language":"en",
+                "country":"US",
+                "currency":"USD",
+                "zip":"",
+                "zipByIp":"",
+                "requestId":""
+            },
+            "query":{
+                "productSearchQuery":{
+                    "taxonomies":[taxonomy_id],
+                    "attributes":{},
+                    "restrictions":{},
+                    "ranges":{},
+                    "searchParameters":{
+                        "fastshipping":None,
+                        "oos":None,
+                        "page":1,
+                        "sort":"bestselling",
+                        "rating":None
                     }
                 },
-                "requires":[
-                    "banners",
-                    "facets",
-                    "meta",
-                    "products",
-                    "redirect",
-                    "relatedSearches",
-                    "selectedFacets",
-                    "seoMetadata",
-                    "sponsoredProducts",
-                    "sponsoredShowcase",
-                    "sortOptions",
-                    "taxonomyFacets",
-                    "notating",
-                    "featuredProduct"
-                ],
-                "conversationalSearch":{},
-                "clientProfileOverrides":{
-                    "productCount":{
-                        "rows":81,
-                        "maxSponsoredProducts":21
-                    },
-                    "sponsoredShowcaseProductCount":{
-                        "rows":0,
-                        "maxSponsoredProducts":0
-                    }
+                "origin":{
+                    "scheme":"https",
+                    "hostType":"DomainName",
+                    "host":"www.overstock.com"
+                }
+            },
+            "requires":[
+                "banners",
+                "facets",
+                "meta",
+                "products",
+                "redirect",
+                "relatedSearches",
+                "selectedFacets",
+                "seoMetadata",
+                "sponsoredProducts",
+                "sponsoredShowcase",
+                "sortOptions",
+                "taxonomyFacets",
+                "notating",
+                "featuredProduct"
+            ],
+            "conversationalSearch":{},
+            "clientProfileOverrides":{
+                "productCount":{
+                    "rows":81,
+                    "maxSponsoredProducts":21
                 },
-                "verboseLogging":False,
-                "url":"https://www.overstock.com/collections/sofas"
-            }
-            self.parse_category(name, payload)
-        except Exception as e:
-            self.print_out(f"parse_page: {name} - {e}")
+                "sponsoredShowcaseProductCount":{
+                    "rows":0,
+                    "maxSponsoredProducts":0
+                }
+            },
+            "verboseLogging":False,
+            "url":"https://www.overstock.com/collections/sofas"
+        }
+
+    def facet_key(self, payload):
+        query = payload["query"]["productSearchQuery"]
+        return json.dumps([query["taxonomies"], query["attributes"], query["ranges"]], sort_keys=True)
+
+    def category_task(self, name, payload, level):
+        return ((name, self.facet_key(payload), level), self.parse_category, name, payload, level)
+
+    def api_fetch(self, name, payload):
+        return Fetch(
+            "POST",
+            self.api_url,
+            category = name,
+            headers = self.site_headers,
+            data = json.dumps(payload)
+        )
+
+    def parse_category(self, name, payload, level="Color", response=None):
+        query = self.facet_key(payload)
+        if self.is_done(name, query, level):
+            return []
+        if not self.claim_query(query):
+            self.print_out(f"parse_category: {name} - {level} - query already crawled")
+            return []
 
-    def parse_category(self, name, payload, level="Color"):
         try:
-            response = self.session.post(
-                self.api_url,
-                headers = self.site_headers,
-                data = json.dumps(payload)
-            ).json()
+            if response is None:
+                response = (yield self.api_fetch(name, payload)).json()
 
             self.print_out(f"parse_category: {name} - {level}")
-            if level == "Facet":
-                self.parse_facet_category(name, payload, response)
-            else:
-                for facet in response.get("facets"):
-                    if facet.get("displayName") == "Color" and level == "Color":
-                        for facet_value in facet.get("values", []):
-                            if facet_value.get("count") == 0:
-                                continue
-
-                            attribute_group_id = facet.get("attributeGroupId")
-                            payload["query"]["productSearchQuery"]["attributes"][attribute_group_id] = {
-                                "id": attribute_group_id,
-                                "values": [facet_value.get("attributeId")]
-                            }
-                            self.parse_category(name, payload, "Price")
-
-                    if facet.get("displayName") == "Price" and level == "Price":
-                        for facet_value in facet.get("values", []):
-                            if facet_value.get("count") == 0:
-                                continue
-
-                            payload["query"]["productSearchQuery"]["ranges"] = {
-                                "price": {
-                                    "id": "price",
-                                    "min": facet_value.get("min"),
-                                    "max": facet_value.get("max")
-                                }
+            if level == "Facet" or self.split_level(self.result_count(response), level) == "Facet":
+                return self.parse_facet_category(name, payload, response)
+
+            tasks = []
+            for facet in response.get("facets"):
+                if facet.get("displayName") == "Color" and level == "Color":
+                    for facet_value in facet.get("values", []):
+                        if facet_value.get("count") == 0:
+                            continue
+
+                        attribute_group_id = facet.get("attributeGroupId")
+                        child_payload = copy.deepcopy(payload)
+                        child_payload["query"]["productSearchQuery"]["attributes"][attribute_group_id] = {
+                            "id": attribute_group_id,
+                            "values": [facet_value.get("attributeId")]
+                        }
+                        tasks.append(self.category_task(name, child_payload, self.split_level(facet_value.get("count", 0), "Price")))
+
+                if facet.get("displayName") == "Price" and level == "Price":
+                    for facet_value in facet.get("values", []):
+                        if facet_value.get("count") == 0:
+                            continue
+
+                        child_payload = copy.deepcopy(payload)
+                        child_payload["query"]["productSearchQuery"]["ranges"] = {
+                            "price": {
+                                "id": "price",
+                                "min": facet_value.get("min"),
+                                "max": facet_value.get("max")
                             }
-                            self.parse_category(name, payload, "Facet")
+                        }
+                        tasks.append(self.category_task(name, child_payload, "Facet"))
+            return tasks
         except Exception as e:
             self.print_out(f"parse_category: {name} - {e}")
+            return None
 
     def parse_facet_category(self, name, payload, response):
-        result_count = response.get("resultCount", 0)
+        result_count = self.result_count(response)
         self.print_out(f"parse_facet_category: {name} - {result_count}")
         if result_count == 0:
-            return
-        elif result_count < 60:
+            return []
+        elif result_count < self.page_size:
             self.parse_products(name, response.get("products"))
-        else:
-            for page_index in range(1, 21):
-                try:
-                    self.print_out(f"parse_facet_category: {page_index}")
-                    payload["query"]["productSearchQuery"]["searchParameters"]["page"] = page_index
-                    response = self.session.post(
-                        self.api_url,
-                        headers = self.site_headers,
-                        data = json.dumps(payload)
-                    ).json()
-                    products = response.get("products")
-                    if len(products) == 0:
-                        return
-                    self.parse_products(name, products)
-                except Exception as e:
-                    self.print_out(f"parse_facet_category: {name} - {page_index} - {e}")
+            return []
+
+        facet_key = self.facet_key(payload)
+        if not self.is_done(name, facet_key, 1):
+            statuses = self.parse_products(name, response.get("products"))
+            self.mark_done(name, facet_key, 1)
+            if self.page_unchanged(statuses):
+                self.stop_listing(name, facet_key, 1)
+                return []
+        if result_count > self.max_pages * self.page_size:
+            self.incomplete(name)
+        return self.page_range_tasks(min(self.max_pages, -(-result_count // self.page_size)), name, payload)
+
+    def parse_page_range(self, name, payload, first, last):
+        facet_key = self.facet_key(payload)
+        payload = copy.deepcopy(payload)
+        completed = True
+        for page_index in range(first, last + 1):
+            if self.listing_stopped(facet_key, page_index):
+                break
+            if self.is_done(name, facet_key, page_index):
+                continue
+
+            try:
+                self.print_out(f"parse_page_range: {page_index}")
+                payload["query"]["productSearchQuery"]["searchParameters"]["page"] = page_index
+                response = (yield self.api_fetch(name, payload)).json()
+                products = response.get("products")
+                if len(products) == 0:
+                    break
+                statuses = self.parse_products(name, products)
+                self.mark_done(name, facet_key, page_index)
+                if self.page_unchanged(statuses):
+                    self.stop_listing(name, facet_key, page_index)
+                    break
+            except Exception as e:
+                self.print_out(f"parse_page_range: {name} - {page_index} - {e}")
+                completed = False
+        return [] if completed else None
+
+    def product_columns(self, name, products):
+        urls = self.validate_column(pluck(products, "url"))
+        keys = [(self.eliminate_space(url.split("-")) or [""])[-1] for url in urls]
+        products, urls, keys = (list(compress(column, keys)) for column in (products, urls, keys))
+        return ProductBatch(keys, {
+            "Description": self.validate_column(pluck(products, "title")),
+            "URL": [f"{self.base_url}/products/{url}" for url in urls],
+            "Price": self.validate_column(pluck(products, "pricing", "minPrice")),
+            "Reviews": array("q", bytes(8 * len(keys))),
+            "Rating": array("d", bytes(8 * len(keys))),
+            "Category": [name] * len(keys),
+        })
 
     def parse_products(self, name, products):
         try:
-            product_data = {}
-            product_ids = []
-            for product in products:
-                product_id = self.eliminate_space(self.validate(product.get("url")).split("-"))[-1]
-                if product_id in self.history:
-                    continue
-
-                product_ids.append(product_id)
-                self.history.append(product_id)
-                product_data[product_id] = {
-                    "Description": self.validate(product.get("title")),
-                    "URL": f"{self.base_url}/products/{self.validate(product.get('url'))}",
-                    "Price": self.validate(product.get("pricing", {}).get("minPrice")),
-                    "Review": 0,
-                    "Rating": 0.0,
-                    "Category": name,
-                }
-
-            review_url = f"https://display.powerreviews.com/m/1280018588/l/en_US/product/{'%2C'.join(product_ids)}/snippet?apikey=0ce15d13-67ca-47dd-8c72-1d5e4694ada3&_noconfig=true"
-            review_response = self.session.get(
-                review_url, 
-                headers={
-                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-                    "Accept-encoding": "gzip, deflate, br, zstd",
-                    "Upgrade-insecure-requests": "1",
-                    "User-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36"
-                }
-            )
-            reviews = review_response.json().get("results")
-            for review in reviews:
-                product_id = self.validate(review.get("page_id"))
-                product_data[product_id]["Reviews"] = self.validate(review.get("rollup", {}).get("review_count"))
-                product_data[product_id]["Rating"] = self.validate(review.get("rollup", {}).get("average_rating"))
-
-            for key, value in product_data.items():
-                self.write(value)
-
+            batch = self.build_batch(name, products, self.product_columns)
+            batch.select(self.remember_many(batch.keys))
+            self.reviews.add_many(list(zip(batch.keys, batch.records(self.csv_headers))))
+            return [self.listed(product_id, {"Price": price}) for product_id, price in zip(batch.keys, batch.columns["Price"])]
         except Exception as e:
             self.print_out(f"parse_product: {name} - {e}")
+            self.incomplete(name)
+            return []
 
 
 class BedbathandbeyondScraper(BaseScraper):
@@ -525,8 +1616,10 @@ class BedbathandbeyondScraper(BaseScraper):
     ]
     counts = {}
     limit = 10000
-    history = []
     name = "bedbath"
+    page_size = 64
+    max_pages = 84
+    cache_vary = ("request-url",)
     default_category = {
         "Sofas and Couches": "Sofas",
         "Sectionals": "Sectionals",
@@ -556,116 +1649,553 @@ class BedbathandbeyondScraper(BaseScraper):
         # "Sports and Outdoors": "",
     }
 
-    def run(self):
-        try:
-            self.print_out("\nStarting...")
-            response = self.session.get(f"{self.base_url}", headers=self.site_headers)
-            tree = etree.HTML(response.text)
-            sections = tree.xpath("//div[@class='swh_DropDown_column']")
-
-            for section_index in [0, 1]:
-                categories = sections[section_index].xpath(".//a[@class='swh_DropDown_columnLink']")
-                for category in categories:
-                    category_name = self.validate(category.xpath(".//text()"))
-                    category_url = self.base_url + self.validate(category.xpath("./@href"))
-                    if category_name in self.default_category:
-                        category_name = self.default_category[category_name]
-                        self.parse_category(category_name, category_url)
-
-            for section_index in range(42, 48):
-                category = sections[section_index]
-                category_name = self.validate(category.xpath(".//a[@class='swh_DropDown_columnLink swh_DropDown_columnTitle']//text()"))
-                category_url = self.base_url + self.validate(category.xpath(".//a[@class='swh_DropDown_columnLink swh_DropDown_columnTitle']/@href"))
-                if category_name in self.default_category:
-                    category_name = self.default_category[category_name]
-                    self.parse_category(category_name, category_url)
+    def discover(self):
+        return self.discover_categories()
 
-        except Exception as e:
-            self.print_out(f"run: {e}")
+    def discover_nav(self, entries):
+        response = yield Fetch("GET", f"{self.base_url}", headers=self.site_headers)
+        tree = etree.HTML(response.text)
+        links = self.nav_links(
+            tree.xpath("//div[@class='swh_DropDown_column']//a[contains(concat(' ', @class, ' '), ' swh_DropDown_columnLink ')]"),
+            ".//text()",
+            "./@href",
+            entries
+        )
+        links = {entry: self.base_url + url for entry, url in links.items()}
+
+        for entry in set(entries) - set(links):
+            self.incomplete(self.default_category[entry])
+        tasks = []
+        for entry, url in links.items():
+            self.discovery.put(entry, {"url": url})
+            tasks.append(self.category_task(self.default_category[entry], url, "Color"))
+        return tasks
+
+    def resolved_target(self, resolved):
+        return resolved["url"]
+
+    def result_count(self, response):
+        return response.get("pageData", {}).get("resultCount", 0)
+
+    def blocked(self, response):
+        return self.api_url in response.url and "json" not in response.headers.get("Content-Type", "")
+
+    def api_fetch(self, name, url):
+        return Fetch(
+            "GET",
+            self.api_url,
+            category = name,
+            headers = {**self.api_headers, "request-url": url}
+        )
+
+    def category_task(self, name, url, level):
+        return ((name, url, level), self.parse_category, name, url, level)
+
+    def parse_category(self, name, url, level="Color", response=None):
+        if self.is_done(name, url, level):
+            return []
+        query = canonical_url(url)
+        if not self.claim_query(query):
+            self.print_out(f"parse_category: {name} - {level} - query already crawled")
+            return []
 
-    def parse_category(self, name, url, level="Color"):
         try:
-            self.api_headers["request-url"] = url
-            response = self.session.get(
-                self.api_url,
-                headers = self.api_headers
-            ).json()
+            if response is None:
+                response = (yield self.api_fetch(name, url)).json()
 
             self.print_out(f"parse_category: {name} - {level}")
-            if level == "Facet":
-                self.parse_facet_category(name, url, response)
-            else:
-                for facet in response.get("pageData", {}).get("facets", []):
-                    if facet.get("displayName") == "Color" and level == "Color":
-                        for facet_value in facet.get("values", []):
-                            if facet_value.get("count") == 0:
-                                continue
-
-                            self.parse_category(
-                                name,
-                                f"{url}&a{facet.get('attributeGroupId')}={facet_value.get('attributeId')}",
-                                "Price"
-                            )
-
-                    if facet.get("displayName") == "Price" and level == "Price":
-                        for facet_value in facet.get("values", []):
-                            if facet_value.get("count") == 0:
-                                continue
-
-                            self.parse_category(
-                                name,
-                                f"{url}&price={facet_value.get('min')}:{facet_value.get('max')}",
-                                "Facet"
-                            )
+            if level == "Facet" or self.split_level(self.result_count(response), level) == "Facet":
+                return self.parse_facet_category(name, url, response)
+
+            tasks = []
+            for facet in response.get("pageData", {}).get("facets", []):
+                if facet.get("displayName") == "Color" and level == "Color":
+                    for facet_value in facet.get("values", []):
+                        if facet_value.get("count") == 0:
+                            continue
+
+                        tasks.append(self.category_task(
+                            name,
+                            f"{url}&a{facet.get('attributeGroupId')}={facet_value.get('attributeId')}",
+                            self.split_level(facet_value.get("count", 0), "Price")
+                        ))
+
+                if facet.get("displayName") == "Price" and level == "Price":
+                    for facet_value in facet.get("values", []):
+                        if facet_value.get("count") == 0:
+                            continue
+
+                        tasks.append(self.category_task(
+                            name,
+                            f"{url}&price={facet_value.get('min')}:{facet_value.get('max')}",
+                            "Facet"
+                        ))
+            return tasks
         except Exception as e:
             self.print_out(f"parse_category: {name} - {e}")
+            return None
 
     def parse_facet_category(self, name, url, response):
-        result_count = response.get("pageData", {}).get("resultCount", 0)
+        result_count = self.result_count(response)
         self.print_out(f"parse_facet_category: {name} - {result_count} - {url}")
         if result_count == 0:
-            return
-        elif result_count < 64:
-            self.parse_products(name, response.get("products"))
-        else:
-            for page_index in range(1, 85):
-                try:
-                    self.api_headers["request-url"] = f"{url}&page={page_index}"
-                    response = self.session.get(
-                        self.api_url,
-                        headers = self.api_headers
-                    ).json()
-                    products = response.get("pageData", {}).get("products", [])
-                    self.print_out(f"parse_facet_category: {name} - {page_index} - {len(products)}")
-                    if len(products) == 0:
-                        return
-                    self.parse_products(name, products)
-                except Exception as e:
-                    self.print_out(f"parse_facet_category: {name} - {page_index}")
-                    return
+            return []
+        elif result_count < self.page_size:
+            self.parse_products(name, response.get("pageData", {}).get("products", []))
+            return []
+
+        if not self.is_done(name, url, 1):
+            statuses = self.parse_products(name, response.get("pageData", {}).get("products", []))
+            self.mark_done(name, url, 1)
+            if self.page_unchanged(statuses):
+                self.stop_listing(name, url, 1)
+                return []
+        if result_count > self.max_pages * self.page_size:
+            self.incomplete(name)
+        return self.page_range_tasks(min(self.max_pages, -(-result_count // self.page_size)), name, url)
+
+    def parse_page_range(self, name, url, first, last):
+        completed = True
+        for page_index in range(first, last + 1):
+            if self.listing_stopped(url, page_index):
+                break
+            if self.is_done(name, url, page_index):
+                continue
+
+            try:
+                response = (yield self.api_fetch(name, f"{url}&page={page_index}")).json()
+                products = response.get("pageData", {}).get("products", [])
+                self.print_out(f"parse_page_range: {name} - {page_index} - {len(products)}")
+                if len(products) == 0:
+                    break
+                statuses = self.parse_products(name, products)
+                self.mark_done(name, url, page_index)
+                if self.page_unchanged(statuses):
+                    self.stop_listing(name, url, page_index)
+                    break
+            except Exception as e:
+                self.print_out(f"parse_page_range: {name} - {page_index} - {e}")
+                completed = False
+        return [] if completed else None
+
+    def product_columns(self, name, products):
+        reviews = self.int_column(pluck(products, "reviews", "count", default=0))
+        products = list(compress(products, reviews))
+        return ProductBatch(self.validate_column(pluck(products, "id")), {
+            "Description": self.validate_column(pluck(products, "name")),
+            "URL": self.validate_column(pluck(products, "urls", "productPage")),
+            "Price": [price.replace("$", "") for price in self.validate_column(pluck(products, "pricing", "base", "price"))],
+            "Reviews": array("q", (count for count in reviews if count)),
+            "Rating": self.validate_column(pluck(products, "reviews", "rating", default=0)),
+            "Category": [name] * len(products),
+        })
 
     def parse_products(self, name, products):
-        for product in products:
+        try:
+            batch = self.build_batch(name, products, self.product_columns)
+            return self.write_batch(batch.select(self.remember_many(batch.keys)))
+        except Exception as e:
+            self.print_out(f"parse_product: {name} - {e}")
+            self.incomplete(name)
+            return []
+
+
+RETAILERS = {
+    "wayfair": WayfairScraper,
+    "overstock": OverstockScraper,
+    "bedbath": BedbathandbeyondScraper,
+}
+PROGRESS_INTERVAL = 30
+
+
+def plan_concurrency(retailers, budget, limits, attribute):
+    concurrency = {}
+    remaining = budget
+    for index, retailer in enumerate(sorted(retailers, key=lambda retailer: limits.get(retailer, budget or 0))):
+        value = getattr(RETAILERS[retailer], attribute)
+        if budget:
+            value = max(1, remaining // (len(retailers) - index))
+            remaining -= min(value, limits.get(retailer, value))
+        concurrency[retailer] = min(value, limits.get(retailer, value))
+    return concurrency
+
+
+def configure(retailer, settings):
+    scraper_class = RETAILERS[retailer]
+    for key, value in settings.items():
+        setattr(scraper_class, key, value)
+    return scraper_class
+
+
+def run_retailer(retailer, settings, resume, log_queue, progress_queue):
+    scraper_class = configure(retailer, {**settings, "log_queue": log_queue})
+    with scraper_class(resume=resume) as scraper:
+        stop = threading.Event()
+
+        def report():
+            while not stop.wait(PROGRESS_INTERVAL):
+                progress_queue.put((retailer, False, scraper.progress()))
+
+        threading.Thread(target=report, daemon=True).start()
+        try:
+            scraper.run()
+        finally:
+            stop.set()
+            progress_queue.put((retailer, True, scraper.progress()))
+
+
+def report_progress(label, stats, finished):
+    lines = []
+    for retailer, progress in sorted(stats.items()):
+        state = "done" if retailer in finished else "running"
+        lines.append(f"{retailer} {state} {progress['rows']} rows/{progress['requests']} requests")
+    message = f"{label}: {' | '.join(lines)}"
+    print(message)
+    logging.info(message)
+
+
+def report_summary(stats, failed):
+    for retailer, progress in sorted(stats.items()):
+        state = "failed" if retailer in failed or progress["failed"] else "ok"
+        message = (
+            f"summary: {retailer} {state} - {progress['rows']} rows, {progress['requests']} requests, "
+            f"{progress['retries']} retries in {progress['seconds']:.0f}s"
+        )
+        print(message)
+        logging.info(message)
+    rows = sum(progress["rows"] for progress in stats.values())
+    requests_made = sum(progress["requests"] for progress in stats.values())
+    message = f"summary: total - {rows} rows, {requests_made} requests"
+    print(message)
+    logging.info(message)
+
+
+def run_processes(settings, resume):
+    log_queue = multiprocessing.Queue()
+    progress_queue = multiprocessing.Queue()
+    processes = {}
+    for retailer, retailer_settings in settings.items():
+        processes[retailer] = multiprocessing.Process(
+            target=run_retailer,
+            args=(retailer, retailer_settings, resume, log_queue, progress_queue),
+            name=retailer
+        )
+        processes[retailer].start()
+
+    handler = logging.FileHandler("history.log")
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)-s %(message)s', '%Y-%m-%d %H:%M:%S'))
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+    stats = {retailer: {"rows": 0, "requests": 0, "retries": 0, "failed": True, "seconds": 0} for retailer in settings}
+    finished = set()
+    try:
+        reported = time.monotonic()
+        while any(process.is_alive() for process in processes.values()):
             try:
-                product_id = self.validate(product.get("id"))
-                review_count = int(self.validate(product.get("reviews", {}).get("count", 0)))
-                if product_id in self.history or review_count == 0:
-                    continue
+                retailer, done, progress = progress_queue.get(timeout=1)
+                stats[retailer] = progress
+                if done:
+                    finished.add(retailer)
+            except queue.Empty:
+                pass
+            if time.monotonic() - reported >= PROGRESS_INTERVAL:
+                report_progress("progress", stats, finished)
+                reported = time.monotonic()
 
-                self.history.append(product_id)
-                data = {
-                    "Description": self.validate(product.get("name")),
-                    "URL": self.validate(product.get("urls", {}).get("productPage")),
-                    "Price": self.validate(product.get("pricing", {}).get("base", {}).get("price")).replace("$", ""),
-                    "Reviews": review_count,
-                    "Rating": self.validate(product.get("reviews", {}).get("rating", 0)),
-                    "Category": name,
-                }
-                self.write(data)
+        while True:
+            try:
+                retailer, done, progress = progress_queue.get(timeout=1)
+            except queue.Empty:
+                break
+            stats[retailer] = progress
+            if done:
+                finished.add(retailer)
+
+        for process in processes.values():
+            process.join()
+
+        report_summary(stats, {retailer for retailer, process in processes.items() if process.exitcode or retailer not in finished})
+    finally:
+        listener.stop()
+        root.removeHandler(handler)
+        handler.close()
+
+
+def bench_retailer(retailer, cache_dir):
+    directory = tempfile.mkdtemp(prefix=f"bench-{retailer}-")
+    os.chdir(directory)
+    try:
+        scraper_class = configure(retailer, {
+            "cache_dir": cache_dir,
+            "offline": True,
+            "sink": "csv",
+            "max_concurrency": 1,
+            "use_debug": False,
+        })
+        started = time.perf_counter()
+        with scraper_class() as scraper:
+            scraper.run()
+        seconds = time.perf_counter() - started
+
+        with open(f"{scraper.name}.csv", newline="", encoding="utf-8") as output_file:
+            rows = sorted(tuple(row) for row in islice(csv.reader(output_file), 1, None))
+        digest = hashlib.sha256(json.dumps(rows).encode("utf-8")).hexdigest()
+        parse_seconds = sum(
+            histogram["sum"] for (name, _), histogram in scraper.metrics.histograms.items() if name == "parse_seconds"
+        )
+        pages = scraper.cache.hits if scraper.cache else 0
+        return {
+            "pages": pages,
+            "rows": len(rows),
+            "digest": digest,
+            "seconds": seconds,
+            "parse_seconds": parse_seconds,
+            "pages_per_second": pages / parse_seconds if parse_seconds else 0,
+            "products_per_second": len(rows) / parse_seconds if parse_seconds else 0,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else None,
+        }
+    finally:
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_bench(retailers, cache_dir, golden=None):
+    expected = {}
+    if golden and os.path.exists(golden):
+        with open(golden, encoding="utf-8") as golden_file:
+            expected = json.load(golden_file)
+
+    results = {}
+    identical = True
+    for retailer in retailers:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            result = executor.submit(bench_retailer, retailer, os.path.abspath(cache_dir)).result()
+        results[retailer] = result
+        peak = f"{result['peak_rss_mb']:.0f} MB" if result["peak_rss_mb"] is not None else "n/a"
+        message = (
+            f"bench: {retailer} - {result['pages']} pages, {result['rows']} rows in {result['seconds']:.1f}s, "
+            f"{result['pages_per_second']:.1f} pages/s, {result['products_per_second']:.0f} products/s parsing, peak RSS {peak}"
+        )
+        if retailer in expected:
+            if (expected[retailer]["rows"], expected[retailer]["digest"]) != (result["rows"], result["digest"]):
+                identical = False
+                message += f" - OUTPUT CHANGED (expected {expected[retailer]['rows']} rows)"
+            else:
+                message += " - output identical"
+        print(message)
+        logging.info(message)
 
-            except Exception as e:
-                self.print_out(f"parse_product: {name} - {e}")
+    if golden and not expected:
+        with open(golden, "w", encoding="utf-8") as golden_file:
+            json.dump({retailer: {"rows": result["rows"], "digest": result["digest"]} for retailer, result in results.items()}, golden_file, indent=1)
+    return identical
+
+
+def iter_cached_bodies(cache_dir, marker):
+    for root, _, files in os.walk(cache_dir):
+        for file_name in files:
+            try:
+                with open(os.path.join(root, file_name), "rb") as cache_file:
+                    header, content = zlib.decompress(cache_file.read()).split(b"\n", 1)
+                entry = json.loads(header)
+            except (OSError, zlib.error, ValueError):
+                continue
+            if marker in entry["url"]:
+                yield content, entry["encoding"]
+
+
+def run_parse_bench(cache_dir, workers):
+    pages = list(iter_cached_bodies(cache_dir, "wayfair.com"))
+    if not pages:
+        print(f"bench: no Wayfair pages recorded under {cache_dir}")
+        return False
+
+    baseline = None
+    expected = None
+    identical = True
+    for count in workers:
+        with ProcessPoolExecutor(max_workers=count) as pool:
+            list(pool.map(abs, range(count)))
+            started = time.perf_counter()
+            results = list(pool.map(parse_wayfair_page, *zip(*pages)))
+            seconds = time.perf_counter() - started
+        digest = hashlib.sha256(json.dumps(results, sort_keys=True).encode("utf-8")).hexdigest()
+        baseline = baseline or seconds
+        expected = expected or digest
+        message = (
+            f"bench: parse x{count} - {len(pages)} pages, {sum(len(records) for records, _ in results)} records "
+            f"in {seconds:.2f}s, {len(pages) / seconds:.1f} pages/s, {baseline / seconds:.1f}x"
+        )
+        if digest != expected:
+            identical = False
+            message += " - OUTPUT CHANGED"
+        print(message)
+        logging.info(message)
+    return identical
+
+
+async def run_event_loop(settings, resume):
+    scrapers = {}
+    try:
+        for retailer, retailer_settings in settings.items():
+            scrapers[retailer] = configure(retailer, retailer_settings)(resume=resume)
+
+        runs = {asyncio.ensure_future(scraper.async_run()): retailer for retailer, scraper in scrapers.items()}
+        pending = set(runs)
+        while pending:
+            _, pending = await asyncio.wait(pending, timeout=PROGRESS_INTERVAL)
+            if pending:
+                finished = {runs[run] for run in runs if run not in pending}
+                report_progress("progress", {retailer: scraper.progress() for retailer, scraper in scrapers.items()}, finished)
+
+        report_summary({retailer: scraper.progress() for retailer, scraper in scrapers.items()}, {runs[run] for run in runs if run.exception()})
+    finally:
+        for scraper in scrapers.values():
+            scraper.close()
 
 
 if __name__ == '__main__':
-    BedbathandbeyondScraper().run()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--retailer", action="append", choices=sorted(RETAILERS), help="retailer to scrape, repeatable (default: all)")
+    parser.add_argument("--category", action="append", help="only scrape this output category, repeatable")
+    parser.add_argument("--concurrency", type=int, help="requests in flight across all retailers")
+    parser.add_argument("--retailer-limit", action="append", default=[], metavar="RETAILER=N", help="cap one retailer's concurrency, repeatable")
+    parser.add_argument("--rate", action="append", default=[], metavar="HOST=RPS", help="send at most RPS requests per second to HOST, e.g. www.wayfair.com=2, repeatable")
+    parser.add_argument("--default-rate", type=float, default=BaseScraper.default_rate, metavar="RPS", help="send at most RPS requests per second to each host without its own --rate")
+    parser.add_argument("--cookies", action="append", default=[], metavar="RETAILER=FILE", help="rotate the Cookie header over the sets in FILE, one per line, repeatable")
+    parser.add_argument("--http2", action="store_true", help="negotiate HTTP/2 with https hosts, needs urllib3 2.3+ with h2 (pip install urllib3[h2]) and falls back to HTTP/1.1 without it")
+    parser.add_argument("--timeout", type=float, default=BaseScraper.request_timeout, metavar="SECONDS", help="give up on a request attempt after SECONDS and retry it")
+    parser.add_argument("--resume", action="store_true", help="skip work finished by the previous run and append to its output")
+    parser.add_argument("--sink", choices=sorted(SINKS), default=BaseScraper.sink, help="output format")
+    parser.add_argument("--shards", metavar="DIR", help="write one rotating shard per category under DIR, committed atomically and listed in a manifest")
+    parser.add_argument("--shard-size", type=int, default=BaseScraper.shard_max_bytes >> 20, metavar="MB", help="size at which a shard is committed and a new one started")
+    parser.add_argument("--shard-seconds", type=int, default=BaseScraper.shard_max_seconds, metavar="SECONDS", help="age at which a shard is committed at the next unit boundary, 0 to commit only by size")
+    parser.add_argument("--background-writer", action="store_true", help="serialize rows on a separate thread")
+    parser.add_argument("--cache", metavar="DIR", help="cache responses on disk under DIR")
+    parser.add_argument("--cache-ttl", type=int, default=BaseScraper.cache_ttl, help="seconds before a cached response is fetched again")
+    parser.add_argument("--offline", action="store_true", help="replay responses from the cache only")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="run every retailer on one asyncio event loop instead of a process each (needs aiohttp)")
+    parser.add_argument("--async-concurrency", type=int, default=BaseScraper.async_concurrency, help="open requests per retailer on the asyncio runtime")
+    parser.add_argument("--parse-workers", type=int, default=BaseScraper.parse_workers, help="parse Wayfair pages in this many processes")
+    parser.add_argument("--no-coalesce", dest="coalesce", action="store_false", help="send identical requests and facet queries again instead of sharing them")
+    parser.add_argument("--api-endpoint", action="append", dest="api_endpoints", metavar="PREFIX", help="send scraping API requests through this URL prefix, endpoint and key, e.g. http://api.scraperapi.com?api_key=KEY&url= (repeat to pool several)")
+    parser.add_argument("--endpoint-cooldown", type=float, default=BaseScraper.endpoint_cooldown, metavar="SECONDS", help="first cooldown of a pool endpoint that failed, doubling with each failure in a row")
+    parser.add_argument("--credit-budget", type=int, default=BaseScraper.credit_budget, metavar="CREDITS", help="scraping API credits a retailer may spend; listings with the best yield of qualifying products go first and low-yield tails are dropped")
+    parser.add_argument("--credit-cost", type=int, default=BaseScraper.credit_cost, metavar="CREDITS", help="credits billed per scraping API request")
+    parser.add_argument("--category-target", type=int, default=BaseScraper.category_target, metavar="N", help="stop a category once N qualifying products were found")
+    parser.add_argument("--stream", action="store_true", help="scan Wayfair listing pages as they download instead of holding whole pages")
+    parser.add_argument("--extractor", action="store_true", help="parse Wayfair pages with the JSON extractor instead of splitting the page text")
+    parser.add_argument("--discovery-ttl", type=int, default=BaseScraper.discovery_ttl, help="seconds a resolved nav category is reused before the homepage is read again")
+    parser.add_argument("--rediscover", action="store_true", help="ignore the discovery cache and resolve every category from the homepage")
+    parser.add_argument("--incremental", action="store_true", help="write only new, changed and removed products since the last incremental run")
+    parser.add_argument("--metrics", metavar="DIR", help="export metrics as JSON and Prometheus text files under DIR")
+    parser.add_argument("--metrics-interval", type=int, default=BaseScraper.metrics_interval, help="seconds between metrics exports")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"], help="profile the run and write the report next to the output")
+    parser.add_argument("--bench", metavar="CACHE_DIR", help="benchmark the parsers offline on responses recorded with --cache")
+    parser.add_argument("--bench-parse", metavar="WORKERS", help="with --bench, time the Wayfair parser pool at each comma-separated size instead, e.g. 1,4,16")
+    parser.add_argument("--bench-golden", metavar="FILE", help="check bench output against FILE, or create it")
+    parser.add_argument("--queue", metavar="DIR", help="shared directory holding the distributed work queues")
+    parser.add_argument("--coordinator", action="store_true", help="publish the root tasks to --queue and exit")
+    parser.add_argument("--worker", action="store_true", help="run tasks from --queue until none are left")
+    parser.add_argument("--partition", help="name of this worker's output partition (default: host and pid)")
+    args = parser.parse_args()
+
+    if bool(args.queue) != (args.coordinator or args.worker):
+        parser.error("--queue goes with one of --coordinator or --worker")
+    if args.coordinator and args.worker:
+        parser.error("--coordinator and --worker are exclusive")
+    if args.queue and args.use_async:
+        parser.error("distributed mode runs on the threaded runtime, drop --async")
+    if args.profile and args.use_async and len(args.retailer or RETAILERS) > 1:
+        parser.error("--profile with --async needs a single --retailer")
+    if args.queue and args.incremental:
+        parser.error("--incremental keeps a local snapshot and cannot run distributed")
+    if args.http2 and args.use_async:
+        parser.error("--http2 runs on the threaded runtime, drop --async")
+    if args.parse_workers and args.use_async:
+        parser.error("--parse-workers runs on the threaded runtime, drop --async")
+    if args.default_rate is not None and args.default_rate <= 0:
+        parser.error("--default-rate must be above 0")
+    if args.credit_cost < 1:
+        parser.error("--credit-cost must be at least 1")
+    if args.bench_parse and not all(count.strip().isdigit() and int(count) > 0 for count in args.bench_parse.split(",")):
+        parser.error(f"--bench-parse: expected sizes like 1,4,16, got {args.bench_parse}")
+
+    limits = {}
+    for limit in args.retailer_limit:
+        retailer, _, value = limit.partition("=")
+        if retailer not in RETAILERS or not value.isdigit():
+            parser.error(f"--retailer-limit: expected RETAILER=N, got {limit}")
+        limits[retailer] = int(value)
+
+    rate_limits = {}
+    for entry in args.rate:
+        host, _, value = entry.partition("=")
+        try:
+            rate_limits[host] = float(value)
+        except ValueError:
+            parser.error(f"--rate: expected HOST=RPS, got {entry}")
+        if not host or rate_limits[host] <= 0:
+            parser.error(f"--rate: expected HOST=RPS, got {entry}")
+
+    cookie_sets = {}
+    for entry in args.cookies:
+        retailer, _, path = entry.partition("=")
+        if retailer not in RETAILERS or not os.path.isfile(path):
+            parser.error(f"--cookies: expected RETAILER=FILE, got {entry}")
+        with open(path, encoding="utf-8") as cookie_file:
+            cookie_sets[retailer] = tuple(line.strip() for line in cookie_file if line.strip())
+
+    BaseScraper.async_concurrency = args.async_concurrency
+    retailers = list(dict.fromkeys(args.retailer or RETAILERS))
+    if args.bench and args.bench_parse:
+        raise SystemExit(0 if run_parse_bench(args.bench, [int(count) for count in args.bench_parse.split(",")]) else 1)
+    if args.bench:
+        raise SystemExit(0 if run_bench(retailers, args.bench, args.bench_golden) else 1)
+    attribute = "async_concurrency" if args.use_async else "max_concurrency"
+    common = {
+        "sink": args.sink,
+        "background_writer": args.background_writer,
+        "shard_dir": args.shards,
+        "shard_max_bytes": args.shard_size << 20,
+        "shard_max_seconds": args.shard_seconds,
+        "cache_dir": args.cache,
+        "cache_ttl": args.cache_ttl,
+        "request_timeout": args.timeout,
+        "use_http2": args.http2,
+        "rate_limits": rate_limits,
+        "default_rate": args.default_rate,
+        "offline": args.offline,
+        "async_concurrency": args.async_concurrency,
+        "categories": args.category,
+        "incremental": args.incremental,
+        "discovery_ttl": args.discovery_ttl,
+        "refresh_discovery": args.rediscover,
+        "stream_responses": args.stream,
+        "use_extractor": args.extractor,
+        "parse_workers": args.parse_workers,
+        "coalesce": args.coalesce,
+        "api_endpoints": tuple(args.api_endpoints or ()),
+        "endpoint_cooldown": args.endpoint_cooldown,
+        "credit_budget": args.credit_budget,
+        "credit_cost": args.credit_cost,
+        "category_target": args.category_target,
+        "metrics_dir": args.metrics,
+        "metrics_interval": args.metrics_interval,
+        "profile": args.profile,
+        "queue_dir": args.queue,
+        "role": "coordinator" if args.coordinator else "worker" if args.worker else None,
+        "partition": args.partition,
+    }
+    settings = {}
+    for retailer, concurrency in plan_concurrency(retailers, args.concurrency, limits, attribute).items():
+        settings[retailer] = {**common, attribute: concurrency, "cookie_sets": cookie_sets.get(retailer, ())}
+
+    if args.use_async:
+        asyncio.run(run_event_loop(settings, args.resume))
+    else:
+        run_processes(settings, args.resume)
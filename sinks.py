@@ -0,0 +1,395 @@
+import abc
+import csv
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class Sink(abc.ABC):
+    def __init__(self, path, headers, append=False, batch_size=500, position=None):
+        self.path = path
+        self.headers = headers
+        self.append = append and position is not None and os.path.exists(path)
+        self.batch_size = batch_size
+        self.position = position
+        self.rows = []
+        self.lock = threading.Lock()
+        self.open()
+
+    def open(self):
+        pass
+
+    @abc.abstractmethod
+    def write_rows(self, rows):
+        pass
+
+    def sync(self):
+        pass
+
+    def tell(self):
+        return None
+
+    def rotate(self):
+        pass
+
+    @classmethod
+    def truncate(cls, path, position):
+        with open(path, "r+b") as file:
+            file.truncate(position)
+
+    def write(self, row):
+        with self.lock:
+            self.rows.append(row)
+            if len(self.rows) >= self.batch_size:
+                self.write_rows(self.rows)
+                self.rows = []
+
+    def write_many(self, rows):
+        with self.lock:
+            self.rows.extend(rows)
+            if len(self.rows) >= self.batch_size:
+                self.write_rows(self.rows)
+                self.rows = []
+
+    def flush(self):
+        with self.lock:
+            if self.rows:
+                self.write_rows(self.rows)
+                self.rows = []
+            self.sync()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CsvSink(Sink):
+    extension = "csv"
+
+    def open(self):
+        if self.append:
+            self.truncate(self.path, self.position)
+        append = self.append and self.position > 0
+        self.file = open(
+            self.path,
+            mode='a' if append else 'w',
+            newline='',
+            encoding="utf-8-sig"
+        )
+        self.writer = csv.writer(
+            self.file,
+            delimiter=',',
+            quotechar='"',
+            quoting=csv.QUOTE_ALL
+        )
+        if not append:
+            self.writer.writerow(self.headers)
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+
+    def sync(self):
+        self.file.flush()
+
+    def tell(self):
+        return os.fstat(self.file.fileno()).st_size
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class JsonlSink(Sink):
+    extension = "jsonl"
+
+    def open(self):
+        if self.append:
+            self.truncate(self.path, self.position)
+        self.file = open(self.path, mode='a' if self.append else 'w', encoding="utf-8")
+
+    def write_rows(self, rows):
+        self.file.write("".join(
+            json.dumps(dict(zip(self.headers, row)), ensure_ascii=False) + "\n" for row in rows
+        ))
+
+    def sync(self):
+        self.file.flush()
+
+    def tell(self):
+        return os.fstat(self.file.fileno()).st_size
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class ParquetSink(Sink):
+    extension = "parquet"
+
+    def open(self):
+        if pyarrow is None:
+            raise RuntimeError("the parquet sink needs pyarrow installed")
+        self.schema = pyarrow.schema([(header, pyarrow.string()) for header in self.headers])
+        if not self.append and os.path.isfile(self.path):
+            os.remove(self.path)
+        self.parts = self.position if self.append else 0
+        self.truncate(self.path, self.parts)
+        self.writer = None
+
+    def part_path(self, index, temp=False):
+        name = f"part-{index:05d}.parquet"
+        return os.path.join(self.path, f".{name}.tmp" if temp else name)
+
+    def write_rows(self, rows):
+        if self.writer is None:
+            self.writer = pyarrow.parquet.ParquetWriter(self.part_path(self.parts, temp=True), self.schema)
+        columns = [[str(row[index]) for row in rows] for index in range(len(self.headers))]
+        self.writer.write_table(pyarrow.Table.from_arrays(columns, schema=self.schema))
+
+    def sync(self):
+        if self.writer is None:
+            return
+        self.writer.close()
+        self.writer = None
+        temp = self.part_path(self.parts, temp=True)
+        with open(temp, "ab") as file:
+            os.fsync(file.fileno())
+        os.replace(temp, self.part_path(self.parts))
+        self.parts += 1
+
+    def tell(self):
+        return self.parts
+
+    @classmethod
+    def truncate(cls, path, position):
+        os.makedirs(path, exist_ok=True)
+        for file_name in os.listdir(path):
+            index = file_name.lstrip(".")[len("part-"):].split(".")[0]
+            if file_name.startswith(".part-") or (file_name.startswith("part-") and index.isdigit() and int(index) >= position):
+                os.remove(os.path.join(path, file_name))
+
+
+class BackgroundSink:
+    def __init__(self, sink, max_pending=10000):
+        self.sink = sink
+        self.rows = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self.drain, daemon=True)
+        self.thread.start()
+
+    def drain(self):
+        while True:
+            rows = self.rows.get()
+            try:
+                if rows is not None:
+                    self.sink.write_many(rows)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.rows.task_done()
+            if rows is None:
+                return
+
+    def write(self, row):
+        self.write_many([row])
+
+    def write_many(self, rows):
+        if self.error:
+            raise self.error
+        self.rows.put(rows)
+
+    def flush(self):
+        self.rows.join()
+        if self.error:
+            raise self.error
+        self.sink.flush()
+
+    def tell(self):
+        return self.sink.tell()
+
+    def rotate(self):
+        self.sink.rotate()
+
+    def close(self):
+        self.rows.put(None)
+        self.thread.join()
+        self.sink.close()
+        if self.error:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ShardedSink:
+    def __init__(self, sink, directory, stem, headers, append=False, batch_size=500, max_bytes=64 << 20, max_seconds=0, position=None):
+        self.sink = sink
+        self.directory = directory
+        self.stem = stem
+        self.headers = headers
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.column = headers.index("Category") if "Category" in headers else None
+        self.shards = {}
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        manifest_path = os.path.join(directory, f"_manifest.{stem}.jsonl")
+        self.run = None
+        if append and os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as manifest:
+                for line in manifest:
+                    try:
+                        self.run = json.loads(line)["run"]
+                    except (ValueError, KeyError):
+                        pass
+        self.run = self.run or time.strftime("%Y%m%dT%H%M%S")
+        self.manifest = open(manifest_path, mode='a', encoding="utf-8")
+        self.recover(position if append else None)
+
+    def relative(self, path):
+        return os.path.relpath(path, self.directory).replace(os.sep, "/")
+
+    def size(self, path):
+        if os.path.isdir(path):
+            return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        return os.path.getsize(path)
+
+    def recover(self, position):
+        prefix = f".{self.stem}."
+        for folder, folders, files in os.walk(self.directory):
+            temps = [name for name in files + folders if name.startswith(prefix) and name.endswith(".tmp")]
+            folders[:] = [name for name in folders if name not in temps]
+            for file_name in temps:
+                temp = os.path.join(folder, file_name)
+                size = (position or {}).get(self.relative(temp))
+                if size is None:
+                    if os.path.isdir(temp):
+                        shutil.rmtree(temp)
+                    else:
+                        os.remove(temp)
+                    continue
+                self.sink.truncate(temp, size)
+                category = os.path.basename(folder).partition("=")[2]
+                self.commit(category, temp, os.path.join(folder, file_name[1:-len(".tmp")]), None)
+
+    def open_shard(self, category):
+        slug = re.sub(r"[^\w.-]+", "_", category).strip("_") or "none"
+        folder = os.path.join(self.directory, f"category={slug}")
+        os.makedirs(folder, exist_ok=True)
+        prefix = f"{self.stem}.{self.run}."
+        index = 0
+        for file_name in os.listdir(folder):
+            name = file_name.lstrip(".")
+            if name.startswith(prefix):
+                sequence = name[len(prefix):].split(".")[0]
+                if sequence.isdigit():
+                    index = max(index, int(sequence) + 1)
+        path = os.path.join(folder, f"{prefix}{index:05d}.{self.sink.extension}")
+        temp = os.path.join(folder, f".{prefix}{index:05d}.{self.sink.extension}.tmp")
+        shard = {
+            "sink": self.sink(temp, self.headers, batch_size=self.batch_size),
+            "temp": temp,
+            "path": path,
+            "rows": 0,
+            "opened": time.monotonic(),
+            "covered": None,
+        }
+        self.shards[category] = shard
+        return shard
+
+    def commit(self, category, temp, path, rows):
+        if os.path.isfile(temp):
+            with open(temp, "ab") as file:
+                os.fsync(file.fileno())
+        os.replace(temp, path)
+        self.manifest.write(json.dumps({
+            "path": self.relative(path),
+            "category": category,
+            "run": self.run,
+            "rows": rows,
+            "bytes": self.size(path),
+            "committed": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }) + "\n")
+        self.manifest.flush()
+        os.fsync(self.manifest.fileno())
+
+    def commit_shard(self, category):
+        shard = self.shards.pop(category)
+        shard["sink"].close()
+        self.commit(category, shard["temp"], shard["path"], shard["rows"])
+
+    def write(self, row):
+        self.write_many([row])
+
+    def write_many(self, rows):
+        categories = {}
+        for row in rows:
+            categories.setdefault(str(row[self.column]) if self.column is not None else "", []).append(row)
+        with self.lock:
+            for category, category_rows in categories.items():
+                shard = self.shards.get(category) or self.open_shard(category)
+                shard["sink"].write_many(category_rows)
+                shard["rows"] += len(category_rows)
+
+    def flush(self):
+        with self.lock:
+            for shard in self.shards.values():
+                shard["sink"].flush()
+
+    def tell(self):
+        with self.lock:
+            return {self.relative(shard["temp"]): shard["sink"].tell() for shard in self.shards.values()}
+
+    def rotate(self):
+        now = time.monotonic()
+        with self.lock:
+            for category in list(self.shards):
+                shard = self.shards[category]
+                if self.size(shard["temp"]) >= self.max_bytes or (self.max_seconds and now - shard["opened"] >= self.max_seconds):
+                    self.commit_shard(category)
+                else:
+                    shard["covered"] = shard["sink"].tell()
+
+    def close(self):
+        with self.lock:
+            for category in list(self.shards):
+                shard = self.shards[category]
+                shard["sink"].flush()
+                if shard["sink"].tell() == shard["covered"]:
+                    self.commit_shard(category)
+                else:
+                    self.shards.pop(category)["sink"].close()
+            self.manifest.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+SINKS = {
+    "csv": CsvSink,
+    "jsonl": JsonlSink,
+    "parquet": ParquetSink,
+}
@@ -0,0 +1,51 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FlakyServer:
+    def __init__(self, faults=None, hang_seconds=2.0):
+        self.faults = {path: list(actions) for path, actions in (faults or {}).items()}
+        self.hang_seconds = hang_seconds
+        self.hits = {}
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def handle(self, request):
+        with self.lock:
+            self.hits.setdefault(request.path, []).append(time.monotonic())
+            actions = self.faults.get(request.path)
+            action = actions.pop(0) if actions else 200
+        if action == "timeout":
+            time.sleep(self.hang_seconds)
+            action = 200
+        try:
+            status, _, retry_after = str(action).partition(":")
+            body = b"ok" if status == "200" else b"<html>try again</html>"
+            request.send_response(int(status))
+            if retry_after:
+                request.send_header("Retry-After", retry_after)
+            request.send_header("Content-Length", str(len(body)))
+            request.end_headers()
+            request.wfile.write(body)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,91 @@
+import csv
+import json
+import os
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+def response(url, body, status=200, headers=None):
+    result = requests.Response()
+    result.status_code = status
+    result.url = url
+    result.headers = CaseInsensitiveDict(headers or {})
+    result.encoding = "utf-8"
+    result._content = body.encode("utf-8") if isinstance(body, str) else body
+    result._content_consumed = True
+    return result
+
+
+def json_response(url, data, status=200):
+    return response(url, json.dumps(data), status, {"Content-Type": "application/json"})
+
+
+def fixture(retailer, name):
+    with open(os.path.join(os.path.dirname(__file__), "fixtures", retailer, name), "rb") as fixture_file:
+        return fixture_file.read()
+
+
+class FakeSession:
+    adapters = {}
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+
+    def mount(self, *args):
+        pass
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url, kwargs))
+        return self.handler(method, url, **kwargs)
+
+
+def bedbath_handler(failing_page=None, result_count=130):
+    def handler(method, url, **kwargs):
+        listing = kwargs["headers"]["request-url"]
+        page_index = int(listing.split("&page=")[1]) if "&page=" in listing else 1
+        if page_index == failing_page:
+            return response(url, "<html>busy</html>")
+        first = (page_index - 1) * 64
+        products = [
+            {"id": f"{listing}-{index}", "name": "Sofa", "urls": {"productPage": f"/p/{index}"},
+             "pricing": {"base": {"price": "$10"}}, "reviews": {"count": 3, "rating": 4.0}}
+            for index in range(first, min(first + 64, result_count))
+        ]
+        return json_response(url, {"pageData": {"resultCount": result_count, "products": products, "facets": []}})
+    return handler
+
+
+def wayfair_page(page_index, last_page=7):
+    items = [
+        {"__typename": "RecommendedListingCollectionItem", "displayName": f"Bed {page_index}-{index}",
+         "listingUrl": f"https://www.wayfair.com/pdp/bed-{page_index}-{index}.html", "amount": "99.00",
+         "totalCount": 150, "averageRating": 4.5}
+        for index in range(12)
+    ]
+    flight = f"0:{json.dumps({'items': items})}\n"
+    return (
+        f"<html><script>self.__next_f.push([1,{json.dumps(flight)}])</script>"
+        f'<a data-enzyme-id="paginationLastPageLink" href="#">{last_page}</a></html>'
+    )
+
+
+def wayfair_handler(method, url, **kwargs):
+    page_index = int(url.split("curpage=")[1]) if "curpage=" in url else 0
+    return response(url, wayfair_page(page_index))
+
+
+def make_scraper(cls, handler, resume=False, **settings):
+    scraper_class = type(cls.__name__, (cls,), {
+        "counts": {},
+        "use_debug": False,
+        "max_concurrency": 1,
+        "get_session": lambda self: FakeSession(handler),
+        **settings,
+    })
+    return scraper_class(resume=resume)
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as output_file:
+        return list(csv.reader(output_file))
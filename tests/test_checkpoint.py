@@ -0,0 +1,86 @@
+import json
+
+from run_me import BedbathandbeyondScraper, OverstockScraper, ProductBatch, WayfairScraper
+from tests.stubs import bedbath_handler, json_response, make_scraper, read_csv, response, wayfair_handler
+from tests.test_tasks import bedbath
+
+
+def overstock_handler(failing_reviews):
+    def handler(method, url, **kwargs):
+        if "powerreviews" in url:
+            if failing_reviews:
+                failing_reviews.pop()
+                return response(url, "<html>busy</html>")
+            ids = url.split("/product/")[1].split("/")[0].split("%2C")
+            return json_response(url, {"results": [{"page_id": product_id, "rollup": {"review_count": 3, "average_rating": 4.5}} for product_id in ids]})
+        page = json.loads(kwargs["data"])["query"]["productSearchQuery"]["searchParameters"]["page"]
+        products = [{"url": f"sofa-{page}{index}", "title": "Sofa", "pricing": {"minPrice": 10}} for index in range(60)] if page <= 2 else []
+        return json_response(url, {"resultCount": 100, "facets": [], "products": products})
+    return handler
+
+
+def overstock(handler, resume=False):
+    return make_scraper(
+        OverstockScraper,
+        handler,
+        resume=resume,
+        review_batch_size=20,
+        review_concurrency=1,
+        discover=lambda self: [self.category_task("Sofas", self.search_payload("1"), "Facet")],
+    )
+
+
+def test_seen_keys_are_committed_with_their_rows(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with make_scraper(BedbathandbeyondScraper, None) as scraper:
+        scraper.remember_many(["1", "2"])
+        scraper.commit_unit("Sofas", "page", 1)
+        assert list(scraper.checkpoint.seen_keys()) == []
+
+        scraper.write_batch(ProductBatch(["1"], {"URL": ["/p/1"], "Category": ["Sofas"]}))
+        scraper.commit_unit("Sofas", "page", 2)
+        assert list(scraper.checkpoint.seen_keys()) == ["1"]
+
+
+def test_failed_review_batch_holds_back_its_category(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with overstock(overstock_handler([True])) as scraper:
+        scraper.run()
+        assert not scraper.is_done("Sofas", scraper.facet_key(scraper.search_payload("1")), 1)
+
+    with overstock(overstock_handler([]), resume=True) as scraper:
+        scraper.run()
+        assert scraper.is_done("Sofas", scraper.facet_key(scraper.search_payload("1")), 1)
+
+    rows = read_csv(tmp_path / "overstock1.csv")[1:]
+    assert len(rows) == len({row[1] for row in rows}) == 120
+
+
+def run_incremental(tmp_path, handler):
+    with bedbath(handler, "https://www.bedbathandbeyond.com/c/sofas?x=1", incremental=True) as scraper:
+        scraper.run()
+    return [row[-1] for row in read_csv(tmp_path / "bedbath.delta.csv")[1:]]
+
+
+def test_incomplete_category_reports_no_removals(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert run_incremental(tmp_path, bedbath_handler()) == ["new"] * 130
+    assert run_incremental(tmp_path, bedbath_handler(failing_page=2)) == []
+    assert run_incremental(tmp_path, bedbath_handler(result_count=100)) == ["removed"] * 30
+
+
+def test_credit_cut_listing_reports_no_removals(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for budget, expected in ((0, ["new"] * 84), (3, [])):
+        with make_scraper(
+            WayfairScraper,
+            wayfair_handler,
+            incremental=True,
+            credit_budget=budget,
+            early_stop=False,
+            use_extractor=True,
+            counts={"Kids": 0},
+            discover=lambda self: [(None, self.parse_products, "https://www.wayfair.com/kids/cat/beds.html", "Kids")],
+        ) as scraper:
+            scraper.run()
+        assert [row[-1] for row in read_csv(tmp_path / "wayfair.delta.csv")[1:]] == expected
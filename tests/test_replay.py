@@ -0,0 +1,99 @@
+import pytest
+
+from run_me import BedbathandbeyondScraper, OverstockScraper, WayfairScraper
+from tests.stubs import fixture, make_scraper, read_csv, response
+
+HEADERS = ["Description", "URL", "Price", "Reviews", "Rating", "Category"]
+
+
+def replay(routes):
+    def handler(method, url, **kwargs):
+        for marker, (retailer, name) in routes.items():
+            if marker in url:
+                return response(url, fixture(retailer, name), headers={"Content-Type": "application/json" if name.endswith(".json") else "text/html"})
+        return response(url, "<html>not found</html>", status=404)
+    return handler
+
+
+def replay_rows(tmp_path, monkeypatch, cls, routes, **settings):
+    monkeypatch.chdir(tmp_path)
+    with make_scraper(cls, replay(routes), **settings) as scraper:
+        scraper.run()
+        assert not scraper.failed
+    rows = read_csv(tmp_path / f"{scraper.name}.csv")
+    assert rows[0] == HEADERS
+    return rows[1:]
+
+
+@pytest.mark.parametrize("use_extractor", [True, False])
+def test_wayfair_replay(tmp_path, monkeypatch, use_extractor):
+    rows = replay_rows(
+        tmp_path, monkeypatch, WayfairScraper,
+        {"curpage=0": ("wayfair", "listing.html"), "curpage=2": ("wayfair", "products.html")},
+        counts={"Kids Beds": 0},
+        use_extractor=use_extractor,
+        discover=lambda self: [(None, self.parse_products, "https://www.wayfair.com/baby-kids/sb0/kids-beds-c1870.html", "Kids Beds")],
+    )
+    assert len(rows) == len({row[1] for row in rows}) == 16
+    assert rows[0] == ["Twin Platform Bed", "https://www.wayfair.com/baby-kids/pdp/zoomie-kids-twin-platform-bed-zmie1234.html", "189.99", "1520", "4.6", "Kids Beds"]
+    assert rows[8] == ["Full Storage Bed", "https://www.wayfair.com/baby-kids/pdp/harriet-bee-full-storage-bed-hbee3102.html", "619.99", "877", "4.5", "Kids Beds"]
+    assert all("/pdp/" in url and 100 <= int(reviews) <= 30000 for _, url, _, reviews, _, _ in rows)
+
+
+def test_overstock_replay(tmp_path, monkeypatch):
+    rows = replay_rows(
+        tmp_path, monkeypatch, OverstockScraper,
+        {"vsearch": ("overstock", "search.json"), "powerreviews": ("overstock", "reviews.json")},
+        discover=lambda self: [self.category_task("Sofas", self.search_payload("1"), "Color")],
+    )
+    assert rows == [
+        ["Corvus Velvet Sofa", "https://www.overstock.com/products/corvus-velvet-sofa-40012345", "689.99", "128", "4.7", "Sofas"],
+        ["Copper Grove Loveseat", "https://www.overstock.com/products/copper-grove-loveseat-40012377", "412.5", "14", "3.9", "Sofas"],
+        ["Modern Sleeper Sofa", "https://www.overstock.com/products/modern-sleeper-sofa-40019001", "899", "0", "0.0", "Sofas"],
+        ["Carson Carrington Sofa", "https://www.overstock.com/products/carson-carrington-sofa-40023310", "1249.0", "3", "5.0", "Sofas"],
+        ["Chesterfield Sofa", "https://www.overstock.com/products/chesterfield-sofa-40030002", "979.95", "0", "0.0", "Sofas"],
+    ]
+
+
+def test_bedbath_replay(tmp_path, monkeypatch):
+    rows = replay_rows(
+        tmp_path, monkeypatch, BedbathandbeyondScraper,
+        {"kronos": ("bedbath", "search.json")},
+        discover=lambda self: [self.category_task("Sofas", "https://www.bedbathandbeyond.com/c/sofas", "Color")],
+    )
+    assert rows == [
+        ["Lark Manor Tufted Sofa", "https://www.bedbathandbeyond.com/Home-Garden/Lark-Manor-Tufted-Sofa/31512345/product.html", "749.99", "86", "4.4", "Sofas"],
+        ["Convertible Futon Sofa", "https://www.bedbathandbeyond.com/Home-Garden/Convertible-Futon-Sofa/31520040/product.html", "329.00", "412", "4.1", "Sofas"],
+        ["Mid-Century Sofa", "https://www.bedbathandbeyond.com/Home-Garden/Mid-Century-Sofa/31533301/product.html", "589.50", "7", "3.6", "Sofas"],
+    ]
+
+
+def discover_nav(tmp_path, monkeypatch, cls, retailer, entries):
+    monkeypatch.chdir(tmp_path)
+    with make_scraper(cls, None) as scraper:
+        steps = scraper.discover_nav(entries)
+        fetch = next(steps)
+        try:
+            steps.send(response(fetch.url, fixture(retailer, "home.html")))
+        except StopIteration as stop:
+            return stop.value
+
+
+def test_overstock_nav_is_matched_by_label(tmp_path, monkeypatch):
+    tasks = discover_nav(tmp_path, monkeypatch, OverstockScraper, "overstock", ["Sofas", "Sectional Sofas", "Bedroom Sets", "TV Stands", "Headboards"])
+    assert {task[4]: task[3] for task in tasks} == {
+        "Sofas": "https://www.overstock.com/c/sofas",
+        "Sectional Sofas": "https://www.overstock.com/c/sectional-sofas",
+        "Bedroom Sets": "https://www.overstock.com/c/bedroom-sets",
+        "TV Stands": "https://www.overstock.com/c/tv-stands",
+    }
+
+
+def test_bedbath_nav_is_matched_by_label(tmp_path, monkeypatch):
+    tasks = discover_nav(tmp_path, monkeypatch, BedbathandbeyondScraper, "bedbath", ["Sofas and Couches", "Sectionals", "Bedroom Sets", "TV Stands", "Beds"])
+    assert sorted(task[0][1] for task in tasks) == [
+        "https://www.bedbathandbeyond.com/c/bedroom-sets",
+        "https://www.bedbathandbeyond.com/c/sectionals",
+        "https://www.bedbathandbeyond.com/c/sofas-and-couches",
+        "https://www.bedbathandbeyond.com/c/tv-stands",
+    ]
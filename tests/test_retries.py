@@ -0,0 +1,169 @@
+import threading
+import time
+
+import pytest
+import requests
+import urllib3.util.ssl_
+from requests.adapters import HTTPAdapter
+
+import requester
+from requester import HTTP2ConnectionPool, Requester
+from run_me import BedbathandbeyondScraper, WayfairScraper
+from tests.flaky_server import FlakyServer
+from tests.stubs import json_response, make_scraper, response
+
+
+def scraper(**settings):
+    return make_scraper(
+        BedbathandbeyondScraper,
+        None,
+        get_session=Requester.get_session,
+        **{"backoff_base": 0.01, "request_timeout": 0.5, **settings},
+    )
+
+
+def test_retries_through_5xx_429_and_timeouts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with FlakyServer({"/page": [500, 503, "429:0.3", "timeout", 502]}) as server, scraper() as client:
+        response = client.request("GET", f"{server.url}/page")
+        assert response.status_code == 200
+        assert len(server.hits["/page"]) == 6
+        assert client.retries == 5
+        assert server.hits["/page"][3] - server.hits["/page"][2] >= 0.3
+
+
+def test_gives_up_after_max_retries(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with FlakyServer({"/page": [503] * 10, "/hang": ["timeout"] * 10}) as server, scraper(max_retry_cnt=2) as client:
+        assert client.request("GET", f"{server.url}/page").status_code == 503
+        assert len(server.hits["/page"]) == 3
+        with pytest.raises(requests.Timeout):
+            client.request("GET", f"{server.url}/hang")
+        assert len(server.hits["/hang"]) == 3
+
+
+def test_retry_budget_caps_retries_across_requests(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with FlakyServer({"/a": [503] * 10, "/b": [503] * 10}) as server, scraper(min_retry_budget=2, retry_budget=0.0) as client:
+        assert client.request("GET", f"{server.url}/a").status_code == 503
+        assert client.request("GET", f"{server.url}/b").status_code == 503
+        assert (len(server.hits["/a"]), len(server.hits["/b"])) == (3, 1)
+        assert client.retries == 2
+
+
+def test_backoff_is_jittered_exponential_and_capped(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with scraper(backoff_base=1.0, backoff_max=5.0) as client:
+        for attempt in range(6):
+            delays = [client.backoff(attempt) for _ in range(200)]
+            assert 0 <= min(delays) and max(delays) <= min(5.0, 2 ** attempt)
+            assert max(delays) > min(5.0, 2 ** attempt) / 2
+        assert client.backoff(0, requests.Response()) <= 1.0
+
+
+def pooled(handler, **settings):
+    return make_scraper(BedbathandbeyondScraper, handler, backoff_base=0.01, **settings)
+
+
+def test_blocked_page_is_retried_on_another_endpoint(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    def handler(method, url, **kwargs):
+        if url.startswith("http://bad"):
+            return response(url, "<html>captcha</html>")
+        return json_response(url, {"pageData": {}})
+
+    with pooled(handler, api_endpoints=("http://bad/?url=", "http://good/?url=")) as client:
+        for _ in range(4):
+            result = client.request("GET", f"{client.scraper_api}{client.api_url}")
+            assert result.status_code == 200 and result.url.startswith("http://good")
+        assert client.endpoints.members[0]["blocks"] >= 1
+        assert client.endpoints.members[0]["until"] > client.endpoints.members[1]["until"]
+
+
+def test_blocked_cookie_set_is_rotated_out(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sent = []
+
+    def handler(method, url, **kwargs):
+        sent.append(kwargs["headers"]["Cookie"])
+        if kwargs["headers"]["Cookie"] == "bad":
+            return response(url, "<html>captcha</html>")
+        return json_response(url, {"pageData": {}})
+
+    with pooled(handler, cookie_sets=("bad", "good")) as client:
+        for _ in range(4):
+            assert client.request("GET", client.api_url, headers=client.api_headers).status_code == 200
+        assert sent.count("bad") == 1 and sent.count("good") == 4
+        assert [member["blocks"] for member in client.cookie_pool.members] == [1, 0]
+
+
+def test_blocked_page_is_retried_and_not_cached_without_a_pool(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pages = ["<html>captcha</html>", '<script>self.__next_f.push([1,"0:[]\\n"])</script>']
+    sent = []
+
+    def handler(method, url, **kwargs):
+        sent.append(url)
+        return response(url, pages[min(len(sent), len(pages)) - 1])
+
+    with make_scraper(WayfairScraper, handler, backoff_base=0.01, cache_dir="cache") as client:
+        url = "https://www.wayfair.com/sb0/sofas-c413892.html"
+        for _ in range(2):
+            assert not client.blocked(client.request("GET", url))
+        assert len(sent) == 2
+
+    pages[1] = pages[0]
+    with make_scraper(WayfairScraper, handler, backoff_base=0.01, cache_dir="cache", max_retry_cnt=1) as client:
+        url = "https://www.wayfair.com/sb0/beds-c46122.html"
+        assert client.blocked(client.request("GET", url))
+        assert client.blocked(client.request("GET", url))
+        assert len(sent) == 6
+
+
+def test_streams_are_bounded_by_the_pool(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pooled(lambda method, url, **kwargs: json_response(url, {}), max_concurrency=1) as client:
+        first = client.request("GET", client.api_url, stream=True)
+        second = client.request("GET", client.api_url, stream=True)
+        assert first.stream_slot is not None and second.stream_slot is None
+        assert [kwargs["stream"] for _, _, kwargs in client.session.requests] == [True, False]
+        client.close_response(first)
+        assert client.request("GET", client.api_url, stream=True).stream_slot is not None
+
+    with make_scraper(WayfairScraper, None, stream_responses=True, cache_dir="cache") as scraper:
+        assert not scraper.streaming()
+
+
+def test_page_windows_share_one_fetch_pool(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    threads = set()
+
+    def fetch(item):
+        threads.add(threading.get_ident())
+        time.sleep(0.01)
+        return item * 2
+
+    with pooled(None, max_concurrency=3) as client:
+        for _ in range(5):
+            assert list(client.fetch_in_order(fetch, range(7))) == [(index, index * 2) for index in range(7)]
+        assert len(threads) <= 3
+
+
+def test_http2_is_scoped_to_the_https_adapter(tmp_path, monkeypatch):
+    pytest.importorskip("h2")
+    monkeypatch.chdir(tmp_path)
+    with scraper(use_http2=True) as client:
+        pool = client.session.get_adapter("https://www.wayfair.com/").poolmanager.connection_from_url("https://www.wayfair.com/")
+        assert isinstance(pool, HTTP2ConnectionPool)
+        assert type(client.session.get_adapter("http://127.0.0.1/")) is HTTPAdapter
+    other = requests.Session().get_adapter("https://www.wayfair.com/").poolmanager.connection_from_url("https://www.wayfair.com/")
+    assert not isinstance(other, HTTP2ConnectionPool)
+    assert urllib3.util.ssl_.ALPN_PROTOCOLS == ["http/1.1"]
+
+
+def test_http2_falls_back_to_http11_without_h2(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(requester, "HTTP2Connection", None)
+    with scraper(use_http2=True) as client:
+        assert type(client.session.get_adapter("https://www.wayfair.com/")) is HTTPAdapter
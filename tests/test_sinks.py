@@ -0,0 +1,84 @@
+import pytest
+
+from sinks import BackgroundSink, CsvSink, ParquetSink, ShardedSink
+from tests.stubs import read_csv
+
+
+class FailingSink(CsvSink):
+    def write_rows(self, rows):
+        raise OSError("disk full")
+
+
+def shard_rows(directory):
+    return [row for path in sorted(directory.glob("**/*.csv")) for row in read_csv(path)[1:]]
+
+
+def test_resumed_shards_keep_only_committed_rows(tmp_path):
+    with ShardedSink(CsvSink, str(tmp_path), "sofas", ["URL", "Category"]) as sink:
+        sink.write_many([["/p/1", "Sofas"], ["/p/2", "Beds"]])
+        sink.flush()
+        position = sink.tell()
+        sink.rotate()
+        sink.write_many([["/p/3", "Sofas"], ["/p/4", "Chairs"]])
+    assert shard_rows(tmp_path) == [["/p/2", "Beds"]]
+
+    with ShardedSink(CsvSink, str(tmp_path), "sofas", ["URL", "Category"], append=True, position=position):
+        pass
+    assert not list(tmp_path.glob("**/.*.tmp"))
+    assert shard_rows(tmp_path) == [["/p/2", "Beds"], ["/p/1", "Sofas"]]
+
+
+def test_resumed_parquet_shards_keep_units_marked_done(tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    sink = ShardedSink(ParquetSink, str(tmp_path), "sofas", ["URL", "Category"])
+    sink.write_many([["/p/1", "Sofas"], ["/p/2", "Beds"]])
+    sink.flush()
+    position = sink.tell()
+    sink.rotate()
+    sink.write_many([["/p/3", "Sofas"]])
+    sink.flush()
+    sink.write_many([["/p/4", "Chairs"]])
+
+    with ShardedSink(ParquetSink, str(tmp_path), "sofas", ["URL", "Category"], append=True, position=position):
+        pass
+    assert not list(tmp_path.glob("**/.*.tmp"))
+    assert sorted(parquet.read_table(str(tmp_path)).column("URL").to_pylist()) == ["/p/1", "/p/2"]
+
+
+def test_shards_are_committed_by_age_at_unit_boundaries(tmp_path):
+    with ShardedSink(CsvSink, str(tmp_path), "sofas", ["URL", "Category"], max_seconds=1e-9) as sink:
+        sink.write_many([["/p/1", "Sofas"]])
+        sink.flush()
+        assert shard_rows(tmp_path) == []
+        sink.rotate()
+        assert shard_rows(tmp_path) == [["/p/1", "Sofas"]]
+
+
+def test_resumed_parquet_keeps_committed_units_after_a_crash(tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "sofas.parquet")
+    sink = ParquetSink(path, ["URL", "Category"], batch_size=1)
+    sink.write(["/p/1", "Sofas"])
+    sink.flush()
+    position = sink.tell()
+    sink.write(["/p/2", "Sofas"])
+    sink.flush()
+    sink.write(["/p/3", "Sofas"])
+    assert parquet.read_table(path).column("URL").to_pylist() == ["/p/1", "/p/2"]
+
+    with ParquetSink(path, ["URL", "Category"], append=True, position=position) as sink:
+        assert parquet.read_table(path).column("URL").to_pylist() == ["/p/1"]
+        sink.write(["/p/4", "Beds"])
+    assert parquet.read_table(path).to_pylist() == [
+        {"URL": "/p/1", "Category": "Sofas"},
+        {"URL": "/p/4", "Category": "Beds"},
+    ]
+
+
+def test_background_sink_raises_write_errors_on_flush(tmp_path):
+    sink = BackgroundSink(FailingSink(str(tmp_path / "sofas.csv"), ["URL"], batch_size=1))
+    sink.write(["/p/1"])
+    with pytest.raises(OSError):
+        sink.flush()
+    with pytest.raises(OSError):
+        sink.close()
@@ -0,0 +1,75 @@
+import threading
+
+from run_me import BedbathandbeyondScraper, WayfairScraper
+from requester import canonical_url
+from tests.stubs import bedbath_handler, json_response, make_scraper, read_csv
+
+
+def bedbath(handler, url, **settings):
+    return make_scraper(
+        BedbathandbeyondScraper,
+        handler,
+        discover=lambda self: [self.category_task("Sofas", url, "Facet")],
+        **{"backoff_base": 0.01, **settings}
+    )
+
+
+def test_failed_subtree_releases_its_query(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    url = "https://www.bedbathandbeyond.com/c/sofas?x=1"
+    with bedbath(bedbath_handler(failing_page=2), url) as scraper:
+        scraper.run()
+        assert canonical_url(url) not in scraper.claimed_queries
+        assert not scraper.is_done("Sofas", url, "Facet")
+
+    with bedbath(bedbath_handler(), url) as scraper:
+        scraper.run()
+        assert canonical_url(url) in scraper.claimed_queries
+        assert scraper.is_done("Sofas", url, "Facet")
+
+
+def test_threaded_drive_runs_under_the_profiler(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with bedbath(bedbath_handler(), "https://www.bedbathandbeyond.com/c/sofas?x=1", max_concurrency=4, profile="cprofile") as scraper:
+        runner = threading.Thread(target=scraper.run, daemon=True)
+        runner.start()
+        runner.join(30)
+        assert not runner.is_alive()
+        assert not scraper.failed
+    assert len(read_csv(tmp_path / "bedbath.csv")) == 131
+    assert (tmp_path / "bedbath.prof").exists()
+
+
+def test_malformed_product_is_skipped_not_its_page(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    products = [
+        {"id": str(index), "name": "Sofa", "urls": {"productPage": f"/p/{index}"},
+         "pricing": {"base": {"price": "$10"}}, "reviews": {"count": 2 ** 70 if index == 3 else 5, "rating": 4.0}}
+        for index in range(10)
+    ]
+
+    def handler(method, url, **kwargs):
+        return json_response(url, {"pageData": {"resultCount": 10, "products": products, "facets": []}})
+
+    with bedbath(handler, "https://www.bedbathandbeyond.com/c/sofas?x=1") as scraper:
+        scraper.run()
+        assert scraper.metrics.counters[("skipped_products", (("category", "Sofas"),))] == 1
+    rows = read_csv(tmp_path / "bedbath.csv")[1:]
+    assert sorted(row[1] for row in rows) == [f"/p/{index}" for index in range(10) if index != 3]
+
+
+def test_row_limit_holds_across_threads(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    batches = [
+        [{"format": "listing", "description": f"Bed {batch}-{index}", "url": f"https://www.wayfair.com/pdp/bed-{batch}-{index}.html",
+          "price": "99.00", "reviews": 150, "rating": 4.5} for index in range(50)]
+        for batch in range(8)
+    ]
+    with make_scraper(WayfairScraper, None, limit=100, counts={"Beds": 0}) as scraper:
+        threads = [threading.Thread(target=scraper.write_records, args=("Beds", batch)) for batch in batches]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert scraper.counts == {"Beds": 101} and scraper.rows == 101
+        assert type(scraper).counts == {"Beds": 0}
@@ -0,0 +1,46 @@
+import codecs
+import json
+import tracemalloc
+
+from tests.stubs import fixture
+from wayfair_stream import PRODUCT_MARKERS, extract_wayfair_products, iter_next_f_chunks, iter_next_f_payloads, parse_wayfair_page
+
+
+def test_chunks_survive_any_piece_boundary():
+    note = {"note": 'ends like a push "])'}
+    text = fixture("wayfair", "listing.html").decode("utf-8")
+    text += "<script>self.__next_f.push([1," + json.dumps("4:" + json.dumps(note) + "\n") + "])</script>"
+    expected = list(iter_next_f_chunks([text]))
+    assert len(expected) == 4
+    for size in (1, 7, 64, 4096):
+        pieces = [text[start:start + size] for start in range(0, len(text), size)]
+        assert list(iter_next_f_chunks(pieces)) == expected
+        assert len(list(extract_wayfair_products(iter_next_f_payloads(iter(pieces), PRODUCT_MARKERS)))) == 14
+    assert note in list(iter_next_f_payloads(text))
+
+
+def peak_memory(parse):
+    tracemalloc.start()
+    try:
+        products = parse()
+        return products, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_streamed_pages_peak_below_the_whole_page():
+    text = fixture("wayfair", "listing.html").decode("utf-8")
+    filler = json.dumps({"header": [{"label": f"Menu {index}", "url": f"/nav/{index}"} for index in range(40000)]})
+    start = text.index("</script>") + len("</script>")
+    script = "<script>self.__next_f.push([1," + json.dumps("0a:" + filler + "\n") + "])</script>"
+    content = (text[:start] + script + text[start:]).encode("utf-8")
+
+    def pieces():
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        for offset in range(0, len(content), 65536):
+            yield decoder.decode(content[offset:offset + 65536])
+
+    whole, whole_peak = peak_memory(lambda: parse_wayfair_page(content, "utf-8")[0])
+    streamed, streamed_peak = peak_memory(lambda: list(extract_wayfair_products(iter_next_f_payloads(pieces(), PRODUCT_MARKERS))))
+    assert streamed == whole and len(streamed) == 14
+    assert streamed_peak < whole_peak * 0.6
@@ -0,0 +1,57 @@
+import json
+import os
+
+from checkpoint import WorkQueue
+from run_me import WayfairScraper
+from tests.stubs import make_scraper, read_csv, wayfair_handler
+
+
+def test_seen_claims_are_scoped_to_the_lease(tmp_path):
+    path = str(tmp_path / "queue.db")
+    first = WorkQueue(path, "first")
+    second = WorkQueue(path, "second")
+    try:
+        first.publish(["a", "b"])
+        task, lease = first.claim()
+        assert first.add_seen_many(["1", "2", "1"], lease) == [True, True, False]
+
+        other, other_lease = second.claim()
+        assert second.add_seen_many(["1", "3"], other_lease) == [False, True]
+
+        first.lease_seconds = 0
+        first.connection.execute("UPDATE tasks SET lease_until = 0 WHERE lease = ?", (lease,))
+        first.connection.commit()
+        assert second.add_seen_many(["1"], other_lease) == [True]
+
+        second.mark_done("task", other, keys=["1"])
+        task, lease = first.claim()
+        assert first.add_seen_many(["1", "2"], lease) == [False, True]
+    finally:
+        first.close()
+        second.close()
+
+
+def test_wayfair_listing_is_split_into_page_range_tasks(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    queue_dir = tmp_path / "queue"
+    queue_dir.mkdir()
+    settings = {
+        "queue_dir": str(queue_dir),
+        "pages_per_task": 2,
+        "partition": "one",
+        "use_extractor": True,
+        "counts": {"Kids": 0},
+        "discover": lambda self: [(None, self.parse_products, "https://www.wayfair.com/kids/cat/beds.html", "Kids")],
+    }
+    with make_scraper(WayfairScraper, wayfair_handler, role="coordinator", **settings) as coordinator:
+        coordinator.run()
+    assert not [name for name in os.listdir(tmp_path) if name.startswith("wayfair")]
+
+    with make_scraper(WayfairScraper, wayfair_handler, role="worker", **settings) as worker:
+        worker.run()
+        tasks = [json.loads(task) for (task,) in worker.checkpoint.connection.execute("SELECT task FROM tasks")]
+        assert worker.checkpoint.states() == {"done": len(tasks)}
+
+    ranges = [args[2] for step, args in tasks if step == "parse_page_range"]
+    assert ranges == [[2, 3], [4, 5], [6, 7]]
+    assert len(read_csv(tmp_path / "wayfair.one.csv")) == 1 + 7 * 12
@@ -0,0 +1,226 @@
+import json
+import re
+
+
+NEXT_F_START = 'self.__next_f.push([1,"'
+NEXT_F_END = '"])'
+ROW_END = "\\n"
+PRODUCT_MARKERS = ("RecommendedListingCollectionItem", "product_name")
+CATEGORY_MARKERS = ("ProductCategory:",)
+LISTING_FIELDS = {"displayName": "description", "listingUrl": "url", "amount": "price", "totalCount": "reviews", "averageRating": "rating"}
+LISTING_DEFAULTS = {"description": "", "url": "", "price": "", "reviews": 0, "rating": ""}
+LAST_PAGE_LINK = re.compile(r'data-enzyme-id="[^"]*paginationLastPageLink[^"]*"[^>]*>([^<]*)<')
+
+
+def escaped(text, index, start):
+    escape = index
+    while escape > start and text[escape - 1] == "\\":
+        escape -= 1
+    return (index - escape) % 2 == 1
+
+
+def find_unescaped(text, token, start):
+    end = text.find(token, start)
+    while end != -1 and escaped(text, end, start):
+        end = text.find(token, end + 1)
+    return end
+
+
+def rfind_unescaped(text, token, start, stop):
+    end = text.rfind(token, start, stop)
+    while end != -1 and escaped(text, end, start):
+        end = text.rfind(token, start, end)
+    return end
+
+
+def scan_offset(text, start, size):
+    index = max(start, len(text) - size + 1)
+    while index > start and text[index - 1] == "\\":
+        index -= 1
+    return index
+
+
+def iter_next_f_segments(pieces):
+    buffer = ""
+    inside = False
+    for piece in pieces:
+        buffer += piece
+        position = 0
+        while True:
+            if not inside:
+                start = buffer.find(NEXT_F_START, position)
+                if start == -1:
+                    buffer = buffer[max(position, len(buffer) - len(NEXT_F_START) + 1):]
+                    break
+                position = start + len(NEXT_F_START)
+                inside = True
+            end = find_unescaped(buffer, NEXT_F_END, position)
+            if end == -1:
+                cut = scan_offset(buffer, position, len(NEXT_F_END))
+                if cut > position:
+                    yield buffer[position:cut], False
+                buffer = buffer[cut:]
+                break
+            yield buffer[position:end], True
+            position = end + len(NEXT_F_END)
+            inside = False
+
+
+def iter_next_f_chunks(pieces):
+    chunk = []
+    for segment, done in iter_next_f_segments(pieces):
+        chunk.append(segment)
+        if done:
+            yield "".join(chunk)
+            chunk = []
+
+
+def flight_rows(flight, markers=None, scanned=0, marked=False):
+    rows = []
+    position = 0
+    search = scanned
+    while True:
+        if markers is not None and not marked:
+            hits = [hit for hit in (flight.find(marker, search) for marker in markers) if hit != -1]
+            if not hits:
+                end = rfind_unescaped(flight, ROW_END, search, len(flight))
+                if end != -1:
+                    position = end + len(ROW_END)
+                return rows, position, scan_offset(flight, position, max(map(len, markers))), False
+            start = rfind_unescaped(flight, ROW_END, search, min(hits))
+            if start != -1:
+                position = start + len(ROW_END)
+            search = min(hits)
+        end = find_unescaped(flight, ROW_END, search)
+        if end == -1:
+            return rows, position, scan_offset(flight, search, len(ROW_END)), True
+        rows.append((position, end))
+        position = search = end + len(ROW_END)
+        marked = False
+
+
+def decode_flight_row(raw, start, end, decoder):
+    colon = raw.find(":", start, end)
+    if colon == -1 or raw[colon + 1:colon + 2] not in ("{", "["):
+        return
+    try:
+        yield decoder.raw_decode(json.loads(f'"{raw[colon + 1:end]}"'))[0]
+    except ValueError:
+        pass
+
+
+def iter_next_f_payloads(pieces, markers=None):
+    if isinstance(pieces, str):
+        pieces = [pieces]
+    decoder = json.JSONDecoder()
+    flight = ""
+    scanned = 0
+    marked = False
+    chunk = None
+    fresh = True
+    for raw, done in iter_next_f_segments(pieces):
+        if fresh and raw[:1] in ("{", "["):
+            chunk = []
+        fresh = done
+        if chunk is not None:
+            chunk.append(raw)
+            if not done:
+                continue
+            raw, chunk = "".join(chunk), None
+            try:
+                yield json.loads(json.loads(f'"{raw}"'))
+                continue
+            except ValueError:
+                pass
+        flight += raw
+        rows, position, scanned, marked = flight_rows(flight, markers, scanned, marked)
+        for start, end in rows:
+            yield from decode_flight_row(flight, start, end, decoder)
+        flight = flight[position:]
+        scanned -= position
+    flight += ROW_END
+    for start, end in flight_rows(flight, markers, scanned, marked)[0]:
+        yield from decode_flight_row(flight, start, end, decoder)
+
+
+def tee_last_page(pieces, found):
+    tail = ""
+    for piece in pieces:
+        if not found:
+            window = tail + piece
+            match = LAST_PAGE_LINK.search(window)
+            if match:
+                found.append(match.group(1))
+            tail = window[-512:]
+        yield piece
+
+
+def iter_nodes(node):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            yield node
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+
+def find_values(node, fields):
+    found = {}
+    stack = [node]
+    while stack and len(found) < len(fields):
+        node = stack.pop()
+        if type(node) is dict:
+            for key, name in fields.items():
+                if key in node and name not in found:
+                    found[name] = node[key]
+            stack.extend(reversed(node.values()))
+        elif type(node) is list:
+            stack.extend(reversed(node))
+    return found
+
+
+def extract_wayfair_products(payloads):
+    for payload in payloads:
+        stack = [payload]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                stack.extend(reversed(node))
+                continue
+            if not isinstance(node, dict):
+                continue
+
+            if node.get("__typename") == "RecommendedListingCollectionItem":
+                yield {"format": "listing", **LISTING_DEFAULTS, **find_values(node, LISTING_FIELDS)}
+            elif "product_name" in node and "review_count" in node:
+                price = ""
+                for child in iter_nodes(node):
+                    if child.get("__typename") == "SFPricing_SinglePrice":
+                        price = child.get("value", "")
+                        break
+                yield {
+                    "format": "product",
+                    "description": node.get("product_name") or "",
+                    "url": node.get("url") or "",
+                    "price": price,
+                    "reviews": node.get("review_count") or 0,
+                    "rating": node.get("average_overall_rating", ""),
+                }
+            else:
+                stack.extend(reversed(list(node.values())))
+
+
+def extract_wayfair_categories(payloads):
+    for payload in payloads:
+        for node in iter_nodes(payload):
+            for key, value in node.items():
+                if key.startswith("ProductCategory:") and isinstance(value, dict):
+                    yield value.get("displayName", ""), value.get("url", "")
+
+
+def parse_wayfair_page(content, encoding):
+    text = content.decode(encoding or "utf-8", errors="replace")
+    match = LAST_PAGE_LINK.search(text)
+    return list(extract_wayfair_products(iter_next_f_payloads(text, PRODUCT_MARKERS))), match.group(1) if match else ""